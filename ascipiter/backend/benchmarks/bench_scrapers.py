@@ -0,0 +1,234 @@
+# benchmarks/bench_scrapers.py
+#
+# Offline micro-benchmarks for the scrapers. Every upstream request is served
+# from the saved pages in benchmarks/fixtures/, so results only reflect
+# parsing/transform cost and are comparable between runs.
+#
+# Usage (from ascipiter/backend):
+#   python benchmarks/bench_scrapers.py                  # run and print results
+#   python benchmarks/bench_scrapers.py --save-baseline  # also write benchmarks/baseline.json
+#   python benchmarks/bench_scrapers.py --compare        # exit 1 if slower than the baseline
+#   python benchmarks/bench_scrapers.py --record         # refresh the fixtures from the live site
+#
+# Set SCRAPER_HTML_PARSER=lxml to benchmark the lxml backend.
+
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import re
+import statistics
+import sys
+import time
+import tracemalloc
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import requests
+
+import http_client
+import html_parsing
+from scrape_menu import BIOLA_CAFE_PAGE_URL, PRINT_MENU_URL_PATTERN, TARGET_STATIONS, _scrape_structured_menu
+from scrape_menu_non_veg import filter_vegetarian_items
+from scrape_weekly import find_weekly_menu_url, find_weekly_menu_url_in_html, scrape_weekly_menu
+from scrape_chapel import get_chapel_events, CHAPEL_URL
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# filter_vegetarian_items is also run on station lists made by concatenating
+# this many days of the fixture menu, to show how it scales with list length.
+VEG_FILTER_SCALE_DAYS = (7, 30)
+
+# A benchmark counts as a regression when its median is this much slower than the baseline.
+DEFAULT_TOLERANCE = 0.25
+
+
+def _read_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), 'rb') as f:
+        return f.read()
+
+
+# --- Network Stub ---
+def _fixture_for(url, weekly_url):
+    if url == BIOLA_CAFE_PAGE_URL:
+        return 'cafe_page.html'
+    if re.fullmatch(PRINT_MENU_URL_PATTERN, url):
+        return 'print_menu.html'
+    if url == weekly_url:
+        return 'weekly_menu.html'
+    if url == CHAPEL_URL:
+        return 'chapel.html'
+    raise RuntimeError(f"No fixture for {url}; the benchmarks must not touch the network")
+
+
+def stub_network():
+    """Serves every http_client request from the fixtures directory."""
+    pages = {}
+    weekly_url = find_weekly_menu_url_in_html(_read_fixture('cafe_page.html'))
+
+    def fake_get(url, headers=None, timeout=None):
+        name = _fixture_for(url, weekly_url)
+        if name not in pages:
+            pages[name] = _read_fixture(name)
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response.encoding = 'utf-8'
+        response._content = pages[name]
+        return response
+
+    http_client.get = fake_get
+    return weekly_url
+
+
+# --- Benchmarks ---
+def build_benchmarks(weekly_url):
+    """Returns {name: zero-argument callable}."""
+    print_menu_url = re.search(PRINT_MENU_URL_PATTERN, _read_fixture('cafe_page.html').decode('utf-8')).group(0)
+
+    # filter_vegetarian_items runs once per station on already-parsed items
+    scraped = _scrape_structured_menu(print_menu_url, TARGET_STATIONS)
+    station_lists = [items for stations in scraped.values() for items in stations.values()]
+
+    benchmarks = {
+        'scrape_menu._scrape_structured_menu': lambda: _scrape_structured_menu(print_menu_url, TARGET_STATIONS),
+        'scrape_menu_non_veg.filter_vegetarian_items': lambda: [filter_vegetarian_items(items) for items in station_lists],
+        'scrape_weekly.find_weekly_menu_url': lambda: find_weekly_menu_url(BIOLA_CAFE_PAGE_URL),
+        'scrape_weekly.scrape_weekly_menu': lambda: scrape_weekly_menu(weekly_url),
+        'scrape_chapel.get_chapel_events': get_chapel_events,
+    }
+    for days in VEG_FILTER_SCALE_DAYS:
+        # Item names get a per-day suffix so repeated days aren't identical lists
+        large_lists = [
+            [dict(item, meal=f"{item['meal']} {day}") for day in range(days) for item in items]
+            for items in station_lists
+        ]
+        benchmarks[f'scrape_menu_non_veg.filter_vegetarian_items[{days}d]'] = (
+            lambda lists=large_lists: [filter_vegetarian_items(items) for items in lists]
+        )
+    return benchmarks
+
+
+def run_benchmark(func, iterations, warmup=3):
+    """Returns timing (ms) and peak traced memory (KiB) for `func`."""
+    for _ in range(warmup):
+        func()
+
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+
+    # Memory is measured in a separate run because tracing slows everything down
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    func()
+    peak_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        'iterations': iterations,
+        'min_ms': min(samples),
+        'median_ms': statistics.median(samples),
+        'mean_ms': statistics.fmean(samples),
+        'peak_kib': peak_bytes / 1024,
+    }
+
+
+def run_all(iterations, only=None):
+    results = {}
+    # Scrapers log and print on every call; keep that out of the measurements
+    logging.disable(logging.CRITICAL)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            weekly_url = stub_network()
+            benchmarks = build_benchmarks(weekly_url)
+            for name, func in benchmarks.items():
+                if only and not any(part in name for part in only):
+                    continue
+                results[name] = run_benchmark(func, iterations)
+    finally:
+        logging.disable(logging.NOTSET)
+    return results
+
+
+def print_results(results, baseline=None):
+    print(f"parser={html_parsing.HTML_PARSER} scoped={html_parsing.SCOPED_PARSING} python={platform.python_version()}")
+    print(f"{'benchmark':48} {'median ms':>10} {'min ms':>10} {'peak KiB':>10} {'vs base':>8}")
+    for name, r in results.items():
+        change = ''
+        if baseline and name in baseline.get('results', {}):
+            change = f"{r['median_ms'] / baseline['results'][name]['median_ms']:.2f}x"
+        print(f"{name:48} {r['median_ms']:10.3f} {r['min_ms']:10.3f} {r['peak_kib']:10.1f} {change:>8}")
+
+
+def find_regressions(results, baseline, tolerance):
+    regressions = []
+    for name, r in results.items():
+        base = baseline.get('results', {}).get(name)
+        if base and r['median_ms'] > base['median_ms'] * (1 + tolerance):
+            regressions.append(name)
+    return regressions
+
+
+def record_fixtures():
+    """Downloads fresh copies of every fixture page from the live site."""
+    cafe_html = http_client.get(BIOLA_CAFE_PAGE_URL).content
+    pages = {
+        'cafe_page.html': cafe_html,
+        'print_menu.html': http_client.get(re.search(PRINT_MENU_URL_PATTERN, cafe_html.decode('utf-8')).group(0)).content,
+        'weekly_menu.html': http_client.get(find_weekly_menu_url_in_html(cafe_html)).content,
+        'chapel.html': http_client.get(CHAPEL_URL).content,
+    }
+    for name, content in pages.items():
+        with open(os.path.join(FIXTURES_DIR, name), 'wb') as f:
+            f.write(content)
+        print(f"Recorded {name} ({len(content)} bytes)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline scraper micro-benchmarks.")
+    parser.add_argument('-n', '--iterations', type=int, default=50)
+    parser.add_argument('-k', '--only', nargs='*', help="Only run benchmarks whose name contains one of these")
+    parser.add_argument('--save-baseline', action='store_true', help=f"Write results to {os.path.relpath(BASELINE_FILE, BACKEND_DIR)}")
+    parser.add_argument('--compare', action='store_true', help="Exit 1 if any benchmark regressed against the baseline")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument('--record', action='store_true', help="Refresh the fixtures from the live site and exit")
+    args = parser.parse_args(argv)
+
+    if args.record:
+        record_fixtures()
+        return 0
+
+    baseline = None
+    if os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE) as f:
+            baseline = json.load(f)
+
+    results = run_all(args.iterations, args.only)
+    print_results(results, baseline)
+
+    if args.save_baseline:
+        with open(BASELINE_FILE, 'w') as f:
+            json.dump({'parser': html_parsing.HTML_PARSER, 'python': platform.python_version(), 'results': results}, f, indent=2)
+        print(f"Baseline saved to {BASELINE_FILE}")
+
+    if args.compare:
+        if baseline is None:
+            print("No baseline to compare against; run with --save-baseline first.")
+            return 1
+        regressions = find_regressions(results, baseline, args.tolerance)
+        if regressions:
+            print(f"Regressions (> {args.tolerance:.0%} slower): {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,202 @@
+# cache_store.py
+
+import datetime
+import hashlib
+import json
+import logging
+import os
+import time
+
+from db import ConnectionPool, CACHE_MIGRATIONS
+
+
+class CacheStore:
+    """
+    A key/value store for the cached scrape results and the announcement,
+    kept in one WAL-mode SQLite file.
+
+    Every put() replaces a key's JSON value in a single transaction, so readers
+    in any process see either the old or the new value, never a partial one.
+    Each key carries a version that goes up by one per change and the UTC
+    timestamp of the last write; version() reads just that number, so callers
+    can tell whether anything changed without loading the value. Writes that
+    change a value also get an event id, increasing across all keys, which
+    changes_since() uses to replay what a reader missed.
+    """
+
+    @staticmethod
+    def _hash(value: str) -> str:
+        return hashlib.sha256(value.encode('utf-8')).hexdigest()[:16]
+
+    def __init__(self, path: str):
+        self.db = ConnectionPool(path, CACHE_MIGRATIONS)
+
+    def get(self, key: str):
+        """
+        Returns:
+            dict | None: {'data', 'timestamp', 'version', 'hash'} or None if `key` was never written.
+        """
+        with self.db.connection() as conn:
+            row = conn.execute('SELECT value, version, updated_at, hash FROM cache_entries WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        return {'data': json.loads(row['value']), 'timestamp': row['updated_at'], 'version': row['version'],
+                'hash': row['hash'] or self._hash(row['value'])}
+
+    def meta(self, key: str):
+        """
+        Like get() without the value, which is only read for rows that have
+        no stored hash yet.
+
+        Returns:
+            dict | None: {'timestamp', 'version', 'hash'} or None if `key` was never written.
+        """
+        with self.db.connection() as conn:
+            row = conn.execute('SELECT version, updated_at, hash FROM cache_entries WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            value_hash = row['hash']
+            if value_hash is None:
+                value_hash = self._hash(conn.execute('SELECT value FROM cache_entries WHERE key = ?', (key,)).fetchone()['value'])
+        return {'timestamp': row['updated_at'], 'version': row['version'], 'hash': value_hash}
+
+    def version(self, key: str) -> int:
+        """The current version of `key`, or 0 if it was never written."""
+        with self.db.connection() as conn:
+            row = conn.execute('SELECT version FROM cache_entries WHERE key = ?', (key,)).fetchone()
+        return row['version'] if row else 0
+
+    def put(self, key: str, data, timestamp: str = None):
+        """
+        Stores `data` (anything JSON-serializable) under `key`. Writing the
+        value a key already holds only refreshes its timestamp: the version
+        and event id stay as they are.
+
+        Args:
+            timestamp (str): UTC ISO timestamp to record; defaults to now.
+
+        Returns:
+            tuple: (version, changed) - the key's version after the write and
+                   whether the value actually changed.
+        """
+        value = json.dumps(data)
+        value_hash = self._hash(value)
+        timestamp = timestamp or datetime.datetime.utcnow().isoformat()
+        with self.db.connection() as conn:
+            conn.execute('BEGIN IMMEDIATE') # Event ids are handed out in commit order
+            row = conn.execute('SELECT value, version FROM cache_entries WHERE key = ?', (key,)).fetchone()
+            if row is not None and row['value'] == value:
+                conn.execute('UPDATE cache_entries SET updated_at = ?, hash = ? WHERE key = ?', (timestamp, value_hash, key))
+                conn.commit()
+                return row['version'], False
+            version = conn.execute('''
+                INSERT INTO cache_entries (key, value, version, updated_at, event_id, hash)
+                VALUES (?, ?, 1, ?, (SELECT COALESCE(MAX(event_id), 0) + 1 FROM cache_entries), ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    value = excluded.value,
+                    version = version + 1,
+                    updated_at = excluded.updated_at,
+                    event_id = excluded.event_id,
+                    hash = excluded.hash
+                RETURNING version
+            ''', (key, value, timestamp, value_hash)).fetchone()[0]
+            conn.commit()
+        return version, True
+
+    def changes_since(self, event_id: int, keys=None) -> list:
+        """
+        The entries changed after `event_id`, oldest change first. Only the
+        latest value of each key is kept, so this is also the state a client
+        that saw `event_id` is missing.
+
+        Args:
+            keys (iterable): Only report these keys; None reports all of them.
+
+        Returns:
+            list: [{'key', 'data', 'version', 'eventId'}]
+        """
+        with self.db.connection() as conn:
+            rows = conn.execute(
+                'SELECT key, value, version, event_id FROM cache_entries WHERE event_id > ? ORDER BY event_id',
+                (event_id,)).fetchall()
+        return [
+            {'key': row['key'], 'data': json.loads(row['value']), 'version': row['version'], 'eventId': row['event_id']}
+            for row in rows if keys is None or row['key'] in keys
+        ]
+
+    # --- Scrape Job Requests ---
+    # Only the leader process scrapes. The others leave requests here, which
+    # the leader takes and runs, and read back when its last run finished.
+
+    def request_job(self, name: str) -> float:
+        """
+        Asks the leader to run job `name`. A request still waiting to be taken
+        is kept as it is.
+
+        Returns:
+            float: The Unix time of the request; a run that finishes at or
+                   after it (see job_run()) answers it.
+        """
+        requested_at = time.time()
+        with self.db.connection() as conn:
+            conn.execute('''
+                INSERT INTO scrape_jobs (name, requested_at) VALUES (?, ?)
+                ON CONFLICT(name) DO UPDATE SET requested_at = COALESCE(requested_at, excluded.requested_at)
+            ''', (name, requested_at))
+            conn.commit()
+        return requested_at
+
+    def take_job_requests(self) -> list:
+        """The names of the jobs requested since the last call, clearing the requests."""
+        with self.db.connection() as conn:
+            names = [row['name'] for row in conn.execute(
+                'UPDATE scrape_jobs SET requested_at = NULL WHERE requested_at IS NOT NULL RETURNING name')]
+            conn.commit()
+        return names
+
+    def record_job_run(self, name: str, succeeded: bool):
+        with self.db.connection() as conn:
+            conn.execute('''
+                INSERT INTO scrape_jobs (name, finished_at, succeeded) VALUES (?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET finished_at = excluded.finished_at, succeeded = excluded.succeeded
+            ''', (name, time.time(), int(succeeded)))
+            conn.commit()
+
+    def job_run(self, name: str):
+        """
+        Returns:
+            dict | None: {'finishedAt', 'succeeded'} for the leader's last run
+                         of `name`, or None if it hasn't finished one.
+        """
+        with self.db.connection() as conn:
+            row = conn.execute('SELECT finished_at, succeeded FROM scrape_jobs WHERE name = ?', (name,)).fetchone()
+        if row is None or row['finished_at'] is None:
+            return None
+        return {'finishedAt': row['finished_at'], 'succeeded': bool(row['succeeded'])}
+
+    def import_json_file(self, key: str, path: str, wrapped: bool = True) -> bool:
+        """
+        Copies a legacy JSON cache file into the store if `key` has never been
+        written. `wrapped` files hold {'timestamp', 'data'}; others hold the
+        value itself.
+
+        Returns:
+            bool: True if the file was imported.
+        """
+        if self.version(key) or not os.path.exists(path):
+            return False
+        try:
+            with open(path, 'r') as f:
+                content = json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            logging.error(f"Could not import legacy cache file {path}: {e}")
+            return False
+
+        if wrapped:
+            if not isinstance(content, dict) or 'data' not in content:
+                return False
+            self.put(key, content['data'], content.get('timestamp'))
+        else:
+            self.put(key, content)
+        logging.info(f"Imported legacy cache file {path} as '{key}'.")
+        return True
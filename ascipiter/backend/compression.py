@@ -0,0 +1,85 @@
+# compression.py
+#
+# Compressed copies of the cached JSON bodies. server.py's response cache
+# builds them once per cache version, at the highest compression levels
+# (cost paid once, not per request), and negotiate() picks the one a
+# request's Accept-Encoding allows.
+
+import gzip
+import struct
+import zlib
+
+try:
+    import brotli
+except ImportError: # Optional: without it only gzip variants are built
+    brotli = None
+
+# --- Configuration ---
+# Bodies smaller than this are sent as they are; compressing them saves
+# less than the headers it adds.
+MIN_COMPRESS_BYTES = 512
+
+# Preferred first when the client accepts several equally.
+ENCODINGS = ('br', 'gzip') if brotli else ('gzip',)
+
+
+def precompress(body: bytes) -> dict:
+    """
+    Returns:
+        dict: encoding -> compressed body, for each encoding that makes `body`
+              smaller. Empty if `body` is too small to bother.
+    """
+    if len(body) < MIN_COMPRESS_BYTES:
+        return {}
+    variants = {}
+    if brotli:
+        variants['br'] = brotli.compress(body, quality=11)
+    variants['gzip'] = gzip.compress(body, compresslevel=9, mtime=0) # mtime=0: same bytes in every worker
+    return {encoding: data for encoding, data in variants.items() if len(data) < len(body)}
+
+
+def negotiate(accept_encodings, variants: dict):
+    """
+    Picks the encoding to send.
+
+    Args:
+        accept_encodings: The request's parsed Accept-Encoding (request.accept_encodings).
+        variants (dict): What precompress() built for the body.
+
+    Returns:
+        str | None: A key of `variants`, or None to send the body uncompressed.
+    """
+    best, best_quality = None, 0
+    for encoding in ENCODINGS:
+        if encoding not in variants:
+            continue
+        quality = accept_encodings[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+# --- Gzip With A Shared Prefix ---
+# For bodies that start with the same (large) bytes for everyone and end with
+# a small per-request part: the prefix is deflated once and ended with a full
+# flush, so each request only compresses its own suffix and appends it.
+# gzip header: deflate, no flags, mtime 0, max compression, OS unknown
+_GZIP_HEADER = b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x02\xff'
+
+
+def gzip_prefix(prefix: bytes) -> dict:
+    """Compresses the shared start of a body, for gzip_with_prefix()."""
+    compressor = zlib.compressobj(9, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return {
+        'deflated': compressor.compress(prefix) + compressor.flush(zlib.Z_FULL_FLUSH),
+        'crc': zlib.crc32(prefix),
+        'length': len(prefix),
+    }
+
+
+def gzip_with_prefix(prefix: dict, suffix: bytes) -> bytes:
+    """A gzip body of prefix + `suffix` where only `suffix` is compressed now."""
+    compressor = zlib.compressobj(1, zlib.DEFLATED, -zlib.MAX_WBITS)
+    deflated = compressor.compress(suffix) + compressor.flush()
+    trailer = struct.pack('<II', zlib.crc32(suffix, prefix['crc']), (prefix['length'] + len(suffix)) & 0xFFFFFFFF)
+    return _GZIP_HEADER + prefix['deflated'] + deflated + trailer
@@ -1,18 +1,12 @@
-import sqlite3
+from db import connect, run_migrations, ANALYTICS_MIGRATIONS
 
-# Connect to the database (this will create the file if it doesn't exist)
-conn = sqlite3.connect('analytics.db')
-cursor = conn.cursor()
+# Connect to the database (this will create the file if it doesn't exist).
+# The server applies the same migrations on startup, so running this is optional.
+conn = connect('analytics.db')
 
-# Create a table with 'date' as the unique primary key
-cursor.execute('''
-    CREATE TABLE IF NOT EXISTS page_loads (
-        date TEXT PRIMARY KEY,
-        count INTEGER NOT NULL
-    )
-''')
+# Create the 'page_loads' table with 'date' as the unique primary key
+run_migrations(conn, ANALYTICS_MIGRATIONS)
 
-conn.commit()
 conn.close()
 
-print("Database 'analytics.db' and table 'page_loads' created successfully.")
\ No newline at end of file
+print("Database 'analytics.db' and table 'page_loads' created successfully.")
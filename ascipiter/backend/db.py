@@ -0,0 +1,249 @@
+# db.py
+
+import sqlite3
+import logging
+import queue
+import threading
+from contextlib import contextmanager
+
+# --- Configuration ---
+# Applied to every connection when it is opened.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',       # Readers no longer block the rating/analytics writers
+    'synchronous': 'NORMAL',     # Safe with WAL; skips an fsync per commit
+    'busy_timeout': 5000,        # ms to wait for a competing writer instead of failing
+    'mmap_size': 64 * 1024 * 1024,
+}
+# Prepared statements kept per connection; pooled connections reuse them across requests.
+STATEMENT_CACHE_SIZE = 128
+DEFAULT_POOL_SIZE = 8
+
+# --- Schema Migrations ---
+# Each list is applied in order; PRAGMA user_version records how many have run,
+# so existing databases only receive the steps they are missing.
+RATINGS_MIGRATIONS = [
+    '''
+    CREATE TABLE IF NOT EXISTS ratings (
+        mealId TEXT PRIMARY KEY,
+        totalStars INTEGER NOT NULL DEFAULT 0,
+        ratingCount INTEGER NOT NULL DEFAULT 0
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS voters (
+        mealId TEXT NOT NULL,
+        anonymousId TEXT NOT NULL,
+        rating INTEGER NOT NULL, -- The user's own vote
+        PRIMARY KEY (mealId, anonymousId)
+    )
+    ''',
+    # Every vote rate_meal commits, in commit order, so a process can apply
+    # the votes other processes made since it last looked instead of
+    # reloading both tables. Trimmed to the last RATINGS_LOG_SIZE rows.
+    '''
+    CREATE TABLE IF NOT EXISTS vote_log (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        mealId TEXT NOT NULL,
+        anonymousId TEXT NOT NULL,
+        rating INTEGER NOT NULL -- 0 = vote removed
+    )
+    ''',
+]
+
+ANALYTICS_MIGRATIONS = [
+    '''
+    CREATE TABLE IF NOT EXISTS page_loads (
+        date TEXT PRIMARY KEY,
+        count INTEGER NOT NULL
+    )
+    ''',
+    # One row per live worker process, so /api/get-loads can ask every worker
+    # to flush its buffered page loads and wait until each has.
+    '''
+    CREATE TABLE IF NOT EXISTS page_load_workers (
+        pid INTEGER PRIMARY KEY,
+        flush_requested INTEGER NOT NULL DEFAULT 0, -- Bumped for each flush asked of this worker
+        flushed INTEGER NOT NULL DEFAULT 0, -- The last flush_requested value it has flushed for
+        seen_at REAL NOT NULL -- Unix time of its last check-in
+    )
+    ''',
+]
+
+CACHE_MIGRATIONS = [
+    '''
+    CREATE TABLE IF NOT EXISTS cache_entries (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL, -- JSON
+        version INTEGER NOT NULL, -- +1 on every write of this key
+        updated_at TEXT NOT NULL -- UTC ISO timestamp of the last write
+    )
+    ''',
+    # Id of the write that last changed each key, unique across keys and
+    # increasing; used as the /api/events event id.
+    'ALTER TABLE cache_entries ADD COLUMN event_id INTEGER NOT NULL DEFAULT 0',
+    'CREATE INDEX IF NOT EXISTS cache_entries_event_id ON cache_entries (event_id)',
+    # Fingerprint of the value, so it can be compared without loading it; see
+    # CacheStore.meta(). NULL for rows written before this column existed.
+    'ALTER TABLE cache_entries ADD COLUMN hash TEXT',
+    # Scrape jobs other processes asked the leader to run, and how the
+    # leader's last run of each went; see CacheStore.request_job().
+    '''
+    CREATE TABLE IF NOT EXISTS scrape_jobs (
+        name TEXT PRIMARY KEY,
+        requested_at REAL, -- Unix time of a request the leader hasn't taken yet
+        finished_at REAL, -- Unix time the leader's last run finished
+        succeeded INTEGER -- Whether that run succeeded
+    )
+    ''',
+]
+
+# Shared by every worker process: metrics.flush() adds each worker's deltas
+# here and profiling.py keeps the slowest profiles here.
+METRICS_MIGRATIONS = [
+    '''
+    CREATE TABLE IF NOT EXISTS metric_values (
+        name TEXT NOT NULL,
+        labels TEXT NOT NULL, -- JSON list of label values
+        field INTEGER NOT NULL, -- Index in the series: 0 for counters; buckets..., +Inf, sum for histograms
+        value NOT NULL, -- Integer counts, real sums
+        PRIMARY KEY (name, labels, field)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS profiles (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL, -- e.g. 'GET /api/menu' or 'job:daily_menus'
+        mode TEXT NOT NULL, -- cprofile / sample
+        duration REAL NOT NULL, -- Seconds
+        captured_at REAL NOT NULL, -- Unix time
+        data BLOB NOT NULL -- pstats file (cprofile) or collapsed stacks (sample)
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS profiles_duration ON profiles (duration)',
+]
+
+ARCHIVE_MIGRATIONS = [
+    '''
+    CREATE TABLE IF NOT EXISTS menu_archive (
+        id INTEGER PRIMARY KEY,
+        date TEXT NOT NULL, -- ISO date the meal was served
+        period TEXT NOT NULL, -- breakfast / lunch / dinner
+        station TEXT NOT NULL COLLATE NOCASE,
+        meal TEXT NOT NULL COLLATE NOCASE,
+        description TEXT,
+        UNIQUE (date, period, station, meal)
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS menu_archive_date ON menu_archive (date)',
+    # External-content FTS5 index: the text lives only in menu_archive and
+    # the triggers below keep the index in step with it.
+    '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS menu_archive_fts USING fts5(
+        meal, description, content='menu_archive', content_rowid='id'
+    )
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS menu_archive_ai AFTER INSERT ON menu_archive BEGIN
+        INSERT INTO menu_archive_fts (rowid, meal, description) VALUES (new.id, new.meal, new.description);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS menu_archive_ad AFTER DELETE ON menu_archive BEGIN
+        INSERT INTO menu_archive_fts (menu_archive_fts, rowid, meal, description) VALUES ('delete', old.id, old.meal, old.description);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS menu_archive_au AFTER UPDATE ON menu_archive BEGIN
+        INSERT INTO menu_archive_fts (menu_archive_fts, rowid, meal, description) VALUES ('delete', old.id, old.meal, old.description);
+        INSERT INTO menu_archive_fts (rowid, meal, description) VALUES (new.id, new.meal, new.description);
+    END
+    ''',
+]
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """Opens a connection to `path` with the tuned pragmas applied."""
+    conn = sqlite3.connect(path, check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE)
+    conn.row_factory = sqlite3.Row
+    for pragma, value in SQLITE_PRAGMAS.items():
+        conn.execute(f'PRAGMA {pragma} = {value}')
+    return conn
+
+
+def run_migrations(conn: sqlite3.Connection, migrations: list) -> int:
+    """
+    Applies the migrations `conn` has not seen yet.
+
+    Returns:
+        int: The number of migrations applied.
+    """
+    # The write lock is taken before user_version is read, so processes
+    # migrating the same file at once (e.g. gunicorn workers starting
+    # together) wait for each other and apply each step exactly once.
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        current_version = conn.execute('PRAGMA user_version').fetchone()[0]
+        pending = migrations[current_version:]
+        for version, statement in enumerate(pending, start=current_version + 1):
+            conn.execute(statement)
+            conn.execute(f'PRAGMA user_version = {version}')
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return len(pending)
+
+
+class ConnectionPool:
+    """
+    A small pool of tuned connections to one SQLite file.
+
+    Connections are opened on demand, handed out with `connection()`, and
+    kept for reuse (up to `size` idle ones) so their prepared statements
+    survive between requests. Migrations run once, on first use.
+    """
+
+    def __init__(self, path: str, migrations: list = None, size: int = DEFAULT_POOL_SIZE):
+        self.path = path
+        self.migrations = migrations or []
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._migrated = False
+        self._migrate_lock = threading.Lock()
+
+    def migrate(self):
+        with self._migrate_lock:
+            if self._migrated:
+                return
+            conn = connect(self.path)
+            try:
+                applied = run_migrations(conn, self.migrations)
+                if applied:
+                    logging.info(f"Applied {applied} migration(s) to {self.path}.")
+            finally:
+                conn.close()
+            self._migrated = True
+
+    @contextmanager
+    def connection(self):
+        if not self._migrated:
+            self.migrate()
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = connect(self.path)
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback() # Never hand out a connection with a half-finished write
+            try:
+                self._idle.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    def close_all(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
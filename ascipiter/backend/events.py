@@ -0,0 +1,134 @@
+# events.py
+#
+# Server-Sent Events for /api/events. Every cache.db write that changes a
+# value gets a new event id (see CacheStore.put); one poller thread per
+# process picks those writes up, whichever process made them, and wakes the
+# open streams. An idle stream is a thread (or greenlet) blocked on a
+# Condition plus a heartbeat comment every EVENTS_HEARTBEAT_SECONDS.
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+# --- Configuration ---
+# How often the poller checks cache.db for writes made by other processes.
+# Writes made by this process wake it immediately (see notify()).
+EVENTS_POLL_SECONDS = float(os.environ.get('EVENTS_POLL_SECONDS', 1))
+# Comment lines sent on quiet streams so proxies keep them open and dead
+# clients are noticed.
+EVENTS_HEARTBEAT_SECONDS = float(os.environ.get('EVENTS_HEARTBEAT_SECONDS', 15))
+# Open streams allowed per process; gunicorn.conf.py sets it from the worker
+# type (a thread per stream with gthread, a greenlet with gevent).
+EVENTS_MAX_STREAMS = int(os.environ.get('EVENTS_MAX_STREAMS', 100))
+# Reconnect delay suggested to EventSource clients.
+EVENTS_RETRY_MS = 3000
+
+
+def encode_event(event_id: int, name: str, data) -> bytes:
+    # json.dumps escapes newlines, so the payload always fits on one data: line
+    return f"id: {event_id}\nevent: {name}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode()
+
+
+class EventBroker:
+    """
+    Fans cache.db changes out to the open /api/events streams.
+
+    Only the latest change of each key is kept, already encoded, so a change
+    is read and serialized once per process however many clients listen, and
+    a client resuming from any Last-Event-ID receives the current value of
+    every key that changed since.
+    """
+
+    def __init__(self, cache_store, keys):
+        self.cache_store = cache_store
+        self.keys = frozenset(keys)
+        self._latest = {} # key -> (event id, encoded event)
+        self._last_event_id = None # None until the first poll
+        self._condition = threading.Condition()
+        self._poll_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._poller = None
+        self._streams = 0
+
+    def start(self):
+        """Starts the poller thread if it isn't running yet."""
+        with self._condition:
+            if self._poller is None:
+                self._poller = threading.Thread(target=self._poll_forever, name='event-poller', daemon=True)
+                self._poller.start()
+
+    def notify(self):
+        """Wakes the poller now, so a write made by this process goes out without waiting for the next poll."""
+        self._wake.set()
+
+    def poll(self) -> int:
+        """
+        Reads the changes made since the last poll and wakes the streams.
+
+        Returns:
+            int: The number of changed keys found.
+        """
+        with self._poll_lock:
+            changes = self.cache_store.changes_since(self._last_event_id or 0, self.keys)
+            with self._condition:
+                for change in changes:
+                    self._latest[change['key']] = (change['eventId'], encode_event(change['eventId'], change['key'], change['data']))
+                if changes:
+                    self._last_event_id = changes[-1]['eventId']
+                    self._condition.notify_all()
+                elif self._last_event_id is None:
+                    self._last_event_id = 0
+            return len(changes)
+
+    def _poll_forever(self):
+        while True:
+            self._wake.clear()
+            try:
+                if self.poll():
+                    logging.info(f"EVENTS: Published changes up to event {self._last_event_id}.")
+            except sqlite3.Error as e:
+                logging.error(f"EVENTS: Error polling the cache store: {e}")
+            self._wake.wait(EVENTS_POLL_SECONDS)
+
+    def _pending(self, cursor):
+        return sorted(event for event in self._latest.values() if event[0] > cursor)
+
+    def stream_count(self) -> int:
+        return self._streams
+
+    def stream(self, last_event_id: int = None):
+        """
+        Yields the bytes of one client's event stream until it disconnects.
+
+        Args:
+            last_event_id (int): The last event the client received. It is
+                                 sent every change after that one; None (or
+                                 an id this process hasn't reached yet) starts
+                                 from the current state.
+        """
+        self.start()
+        if self._last_event_id is None:
+            self.poll()
+        with self._condition:
+            self._streams += 1
+            cursor = last_event_id
+            if cursor is None or cursor > self._last_event_id:
+                cursor = self._last_event_id
+        try:
+            yield f"retry: {EVENTS_RETRY_MS}\n\n".encode()
+            while True:
+                with self._condition:
+                    pending = self._pending(cursor)
+                    if not pending:
+                        self._condition.wait(EVENTS_HEARTBEAT_SECONDS)
+                        pending = self._pending(cursor)
+                if pending:
+                    cursor = pending[-1][0]
+                    yield b''.join(event for _, event in pending)
+                else:
+                    yield b': heartbeat\n\n'
+        finally:
+            with self._condition:
+                self._streams -= 1
@@ -0,0 +1,29 @@
+# gunicorn.conf.py
+#
+# Production serving: gunicorn -c gunicorn.conf.py 'server:create_app()'
+# (run from ascipiter/backend). Each worker calls create_app() itself, so
+# preload_app must stay off; one worker is elected to run the scrapes.
+
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:5001')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+# Every open /api/events stream holds its connection until the client leaves,
+# tying up one of a gthread worker's `threads` while the rest keep serving
+# cached responses and waits on live menu refreshes.
+# GUNICORN_WORKER_CLASS=gevent (pip install gevent) holds far more idle
+# streams per worker, as greenlets. But sqlite calls and BeautifulSoup parses
+# then block every stream in the worker while they run. Profiling is also off
+# under gevent (see profiling.py).
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+if worker_class == 'gevent':
+    worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+    REQUEST_CONNECTIONS = 100 # Always left for ordinary requests
+    os.environ.setdefault('EVENTS_MAX_STREAMS', str(max(worker_connections - REQUEST_CONNECTIONS, 1)))
+else:
+    threads = int(os.environ.get('GUNICORN_THREADS', 64))
+    REQUEST_THREADS = 8 # Always left for ordinary requests
+    os.environ.setdefault('EVENTS_MAX_STREAMS', str(max(threads - REQUEST_THREADS, 1)))
+timeout = 120
+preload_app = False
@@ -0,0 +1,58 @@
+# html_parsing.py
+
+import os
+import logging
+
+from bs4 import BeautifulSoup, FeatureNotFound, SoupStrainer
+
+# --- Configuration ---
+# Tree builder used by every scraper. 'html.parser' is the stdlib default;
+# 'lxml' is several times faster but needs the lxml package installed.
+HTML_PARSER = os.environ.get('SCRAPER_HTML_PARSER', 'html.parser')
+
+# When True, scrapers only build the subtrees they read (see the strainers
+# below) instead of the whole document.
+SCOPED_PARSING = os.environ.get('SCRAPER_SCOPED_PARSING', '1') != '0'
+
+FALLBACK_PARSER = 'html.parser'
+_unavailable_parsers = set()
+
+
+def has_class(*class_names):
+    """
+    A class_ matcher for SoupStrainer. While parsing, bs4 hands strainers the
+    raw class attribute ("row odd"), so class_='row' alone would not match.
+    """
+    wanted = set(class_names)
+
+    def match(value):
+        if not value:
+            return False
+        classes = value.split() if isinstance(value, str) else value
+        return not wanted.isdisjoint(classes)
+    return match
+
+
+# --- Strainers ---
+PRINT_MENU_STRAINER = SoupStrainer('div', id='menu-items')
+WEEKLY_MENU_STRAINER = SoupStrainer('div', class_=has_class('row', 'weekdays'))
+LINKS_STRAINER = SoupStrainer('a')
+CHAPEL_STRAINER = SoupStrainer('ul', class_=has_class('chapel-list'))
+
+
+def make_soup(content, strainer: SoupStrainer = None) -> BeautifulSoup:
+    """
+    Parses `content` with the configured backend. `strainer` limits the tree
+    to matching elements and their descendants when SCOPED_PARSING is on.
+    """
+    parser = HTML_PARSER
+    if parser in _unavailable_parsers:
+        parser = FALLBACK_PARSER
+    parse_only = strainer if SCOPED_PARSING else None
+
+    try:
+        return BeautifulSoup(content, parser, parse_only=parse_only)
+    except FeatureNotFound:
+        logging.warning(f"HTML parser '{parser}' is not installed, falling back to '{FALLBACK_PARSER}'.")
+        _unavailable_parsers.add(parser)
+        return BeautifulSoup(content, FALLBACK_PARSER, parse_only=parse_only)
@@ -0,0 +1,177 @@
+# http_client.py
+
+import hashlib
+import logging
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+# --- Configuration ---
+# One User-Agent for every upstream request.
+USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.114 Safari/537.36'
+
+# Request timeouts in seconds, per host. Hosts not listed use DEFAULT_TIMEOUT.
+DEFAULT_TIMEOUT = 15
+HOST_TIMEOUTS = {
+    'cafebiola.cafebonappetit.com': 15,
+    'legacy.cafebonappetit.com': 30, # The print/weekly menu pages are slow to render
+    'www.biola.edu': 15,
+}
+
+# Retries for connection errors, timeouts and the statuses below. The wait
+# before retry n is a random amount up to min(BACKOFF_MAX, BACKOFF_BASE * 2**n).
+MAX_RETRIES = 2
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 8
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Keep-alive connections kept open per host.
+POOL_MAXSIZE = 10
+
+_session = requests.Session()
+_session.headers['User-Agent'] = USER_AGENT
+_adapter = HTTPAdapter(pool_connections=len(HOST_TIMEOUTS) + 2, pool_maxsize=POOL_MAXSIZE)
+_session.mount('https://', _adapter)
+_session.mount('http://', _adapter)
+
+# --- Deadlines ---
+# A per-thread absolute deadline (time.monotonic()) set by the scrape executor.
+# Requests made after it has passed fail immediately, and timeouts/backoff are
+# clamped to the time left, so a job past its deadline stops touching the network.
+_deadline = threading.local()
+
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+    """Raised instead of making a request once the current job's deadline has passed."""
+
+
+def set_deadline(deadline: float | None):
+    _deadline.at = deadline
+
+
+def deadline_remaining() -> float | None:
+    """Seconds left before the current thread's deadline, or None if it has none."""
+    at = getattr(_deadline, 'at', None)
+    return None if at is None else at - time.monotonic()
+
+
+# --- Request Timings ---
+# Every request attempt is counted and timed per host in metrics.py, and so
+# exported on /metrics.
+def _record_timing(host: str, elapsed: float, failed: bool):
+    metrics.UPSTREAM_LATENCY.observe(elapsed, host)
+    metrics.UPSTREAM_REQUESTS.inc(host, 'failure' if failed else 'success')
+
+
+def _backoff_delay(attempt: int) -> float:
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+
+def _sleep_before_retry(delay: float, url: str):
+    remaining = deadline_remaining()
+    if remaining is not None and remaining <= delay:
+        raise DeadlineExceeded(f"Deadline would pass before retrying GET {url}")
+    time.sleep(delay)
+
+
+def get(url: str, headers: dict = None, timeout: float = None) -> requests.Response:
+    """
+    GETs `url` through the shared keep-alive session, retrying transient
+    failures with exponential backoff and jitter.
+
+    Args:
+        url (str): The URL to fetch.
+        headers (dict): Extra headers for this request.
+        timeout (float): Overrides the per-host timeout.
+
+    Returns:
+        requests.Response: The last response received. Callers still call
+                           raise_for_status() for non-retryable errors.
+
+    Raises:
+        requests.exceptions.RequestException: If every attempt failed to connect or timed out.
+        DeadlineExceeded: If the current job's deadline passed (a Timeout subclass).
+    """
+    host = urlsplit(url).hostname or ''
+    if timeout is None:
+        timeout = HOST_TIMEOUTS.get(host, DEFAULT_TIMEOUT)
+
+    for attempt in range(MAX_RETRIES + 1):
+        remaining = deadline_remaining()
+        if remaining is not None and remaining <= 0:
+            raise DeadlineExceeded(f"Deadline passed before GET {url}")
+        attempt_timeout = timeout if remaining is None else min(timeout, remaining)
+
+        started = time.perf_counter()
+        try:
+            response = _session.get(url, headers=headers, timeout=attempt_timeout)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            elapsed = time.perf_counter() - started
+            _record_timing(host, elapsed, failed=True)
+            if attempt == MAX_RETRIES:
+                raise
+            delay = _backoff_delay(attempt)
+            logging.warning(f"GET {url} failed after {elapsed * 1000:.0f} ms ({e}), retrying in {delay:.1f}s")
+            _sleep_before_retry(delay, url)
+            continue
+
+        elapsed = time.perf_counter() - started
+        retryable = response.status_code in RETRY_STATUSES
+        _record_timing(host, elapsed, failed=retryable)
+        logging.info(f"GET {url} -> {response.status_code} in {elapsed * 1000:.0f} ms")
+        if not retryable or attempt == MAX_RETRIES:
+            return response
+        delay = _backoff_delay(attempt)
+        logging.warning(f"GET {url} returned {response.status_code}, retrying in {delay:.1f}s")
+        _sleep_before_retry(delay, url)
+
+
+# --- Conditional Request Cache ---
+# The last 200 response seen for each URL. Its ETag/Last-Modified headers are
+# sent back on the next request, and if the upstream answers 304 the stored
+# response is returned in place of the empty one.
+_last_responses = {}
+_last_responses_lock = threading.Lock()
+
+
+def conditional_get(url: str, headers: dict = None, timeout: float = None) -> requests.Response:
+    """
+    Like get(), but revalidates against the last successful response for
+    `url` instead of re-downloading it.
+
+    Returns:
+        requests.Response: The new response, or the previously stored one if
+                           the upstream reports it as not modified.
+    """
+    request_headers = dict(headers or {})
+    with _last_responses_lock:
+        previous = _last_responses.get(url)
+    if previous is not None:
+        if previous.headers.get('ETag'):
+            request_headers['If-None-Match'] = previous.headers['ETag']
+        if previous.headers.get('Last-Modified'):
+            request_headers['If-Modified-Since'] = previous.headers['Last-Modified']
+
+    response = get(url, headers=request_headers, timeout=timeout)
+
+    if response.status_code == 304 and previous is not None:
+        logging.info(f"Upstream not modified, reusing last response: {url}")
+        return previous
+
+    if response.status_code == 200 and (response.headers.get('ETag') or response.headers.get('Last-Modified')):
+        with _last_responses_lock:
+            _last_responses[url] = response
+    return response
+
+
+def content_hash(content: bytes | str) -> str:
+    """A stable fingerprint of a response body."""
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    return hashlib.sha256(content).hexdigest()
@@ -0,0 +1,53 @@
+# leader.py
+#
+# Elects one process (e.g. one gunicorn worker) to run the scrape jobs. The
+# leader holds an exclusive flock on LEADER_LOCK_FILE for as long as it lives;
+# the OS drops the lock when it exits, and another worker's next
+# try_acquire() takes over.
+
+import logging
+import os
+
+try:
+    import fcntl
+except ImportError: # Windows: no flock, so the single process always leads
+    fcntl = None
+
+# --- Configuration ---
+LEADER_LOCK_FILE = os.environ.get('SCHEDULER_LOCK_FILE', 'scheduler.lock')
+
+_lock_file = None
+
+
+def try_acquire() -> bool:
+    """
+    Tries to become the leader without blocking.
+
+    Returns:
+        bool: True if this process is (now) the leader.
+    """
+    global _lock_file
+    if _lock_file is not None:
+        return True
+    if fcntl is None:
+        _lock_file = True
+        return True
+
+    lock_file = open(LEADER_LOCK_FILE, 'a+')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+
+    lock_file.seek(0)
+    lock_file.truncate()
+    lock_file.write(f"{os.getpid()}\n") # For humans: which process is leading
+    lock_file.flush()
+    _lock_file = lock_file
+    logging.info(f"Process {os.getpid()} is now the scheduler leader.")
+    return True
+
+
+def is_leader() -> bool:
+    return _lock_file is not None
@@ -0,0 +1,111 @@
+# leaderboard.py
+
+import bisect
+import os
+import re
+
+from scrape_menu import TARGET_STATIONS
+
+# --- Configuration ---
+# Meals are ranked by a Bayesian average: every meal starts with
+# RATING_PRIOR_VOTES imaginary votes of RATING_PRIOR_MEAN stars, so a single
+# 5-star vote can't outrank a meal with dozens of 4- and 5-star votes.
+RATING_PRIOR_MEAN = float(os.environ.get('RATING_PRIOR_MEAN', 3.0))
+RATING_PRIOR_VOTES = float(os.environ.get('RATING_PRIOR_VOTES', 5))
+
+# Meals are kept in one ranked list per vote-count tier (meals with at least
+# that many votes), so a min_votes filter starts from the nearest tier instead
+# of skipping over every low-count meal.
+MIN_VOTE_TIERS = (1, 3, 5, 10, 25, 50)
+
+MAX_TOP_LIMIT = 100
+
+
+def _slug(text: str) -> str:
+    return re.sub(r'-+', '-', re.sub(r'[^a-z0-9]', '-', (text or '').lower()))
+
+
+def station_slug(name: str) -> str:
+    """A station name as it appears in meal ids (see createMealId in MealItem.jsx)."""
+    return _slug(name)[:25]
+
+
+def meal_id(station: str, meal: str, date: str) -> str:
+    """The id the frontend rates `meal` under on `date` (YYYY-MM-DD), as createMealId builds it."""
+    return f"{station_slug(station)}-{_slug(meal)[:40]}-{date}"
+
+
+# Longest first, so a station whose slug extends another's is matched fully.
+STATION_SLUGS = sorted({station_slug(name) for name in TARGET_STATIONS}, key=len, reverse=True)
+
+
+def station_of(meal_id: str) -> str | None:
+    """The station slug a meal id starts with, or None if it isn't a known station."""
+    for slug in STATION_SLUGS:
+        if meal_id.startswith(slug + '-'):
+            return slug
+    return None
+
+
+def bayesian_average(total_stars: int, rating_count: int) -> float:
+    return (RATING_PRIOR_MEAN * RATING_PRIOR_VOTES + total_stars) / (RATING_PRIOR_VOTES + rating_count)
+
+
+class Leaderboard:
+    """
+    Meals ranked by Bayesian average, updated one meal at a time.
+
+    Each (station, tier) pair has a list sorted best-first, where station is
+    a slug or None for all stations. update() moves one meal in O(log n)
+    searches, and top() reads at most `limit` entries from one list when
+    min_votes is a tier. Not thread-safe; RatingStore calls it under its lock.
+    """
+
+    def __init__(self):
+        self._ranked = {}  # (station, tier) -> sorted [(-score, -ratingCount, mealId)]
+        self._entries = {} # mealId -> (entry, station, ratingCount) currently ranked
+
+    def clear(self):
+        self._ranked.clear()
+        self._entries.clear()
+
+    def _lists_for(self, station, rating_count):
+        for tier in MIN_VOTE_TIERS:
+            if rating_count < tier:
+                break
+            yield (None, tier)
+            if station is not None:
+                yield (station, tier)
+
+    def update(self, meal_id: str, total_stars: int, rating_count: int):
+        """Re-ranks `meal_id` after its aggregate changed (or drops it at 0 votes)."""
+        previous = self._entries.pop(meal_id, None)
+        if previous is not None:
+            entry, station, old_count = previous
+            for key in self._lists_for(station, old_count):
+                ranked = self._ranked[key]
+                del ranked[bisect.bisect_left(ranked, entry)]
+        else:
+            station = station_of(meal_id)
+
+        if rating_count <= 0:
+            return
+        entry = (-bayesian_average(total_stars, rating_count), -rating_count, meal_id)
+        for key in self._lists_for(station, rating_count):
+            bisect.insort(self._ranked.setdefault(key, []), entry)
+        self._entries[meal_id] = (entry, station, rating_count)
+
+    def top(self, limit: int = 10, station: str = None, min_votes: int = 1) -> list:
+        """
+        Returns:
+            list: Up to `limit` of (mealId, score, ratingCount), best first.
+        """
+        tier = max((t for t in MIN_VOTE_TIERS if t <= max(min_votes, 1)), default=MIN_VOTE_TIERS[0])
+        results = []
+        for neg_score, neg_count, meal_id in self._ranked.get((station, tier), ()):
+            if -neg_count < min_votes:
+                continue
+            results.append((meal_id, -neg_score, -neg_count))
+            if len(results) >= limit:
+                break
+        return results
@@ -0,0 +1,135 @@
+# menu_archive.py
+#
+# Every successful menu scrape is appended to the menu_archive table (one row
+# per date/period/station/meal), with an FTS5 index over meal names and
+# descriptions so past menus can be searched. Schema: ARCHIVE_MIGRATIONS in db.py.
+
+import datetime
+import re
+
+# Same order as scrape_weekly.parse_weekly_menu's day headers.
+WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+# Row ids are date.toordinal() * ROWS_PER_DAY + n, so id order is date order
+# and a search can read the FTS index newest-first and stop at the limit
+# instead of sorting every match.
+ROWS_PER_DAY = 1_000_000
+
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 200
+
+
+def _normalize_period(period: str) -> str:
+    # Brunch is shown as lunch everywhere else (see transform_menu_data)
+    period = period.lower()
+    return 'lunch' if period == 'brunch' else period
+
+
+def _insert_rows(conn, rows) -> int:
+    # Re-scrapes of the same day hit the UNIQUE key and are ignored, so the
+    # hourly job only ever adds meals that weren't archived yet.
+    with conn:
+        cursor = conn.executemany('''
+            INSERT OR IGNORE INTO menu_archive (id, date, period, station, meal, description)
+            VALUES ((SELECT COALESCE(MAX(id) + 1, :first_id) FROM menu_archive WHERE id >= :first_id AND id < :first_id + :per_day),
+                    :date, :period, :station, :meal, :description)
+        ''', [
+            {'first_id': datetime.date.fromisoformat(date).toordinal() * ROWS_PER_DAY, 'per_day': ROWS_PER_DAY,
+             'date': date, 'period': period, 'station': station, 'meal': meal, 'description': description}
+            for date, period, station, meal, description in rows
+        ])
+    return cursor.rowcount # Counts the rows inserted, not the FTS trigger's writes
+
+
+def archive_daily_menu(conn, menu_data: dict, date: datetime.date = None) -> int:
+    """
+    Archives a day's menu in the /api/menu format ({period: [{name, options}]}).
+
+    Returns:
+        int: The number of meals added.
+    """
+    date = (date or datetime.date.today()).isoformat()
+    rows = [
+        (date, _normalize_period(period), station['name'], option['meal'], option.get('description'))
+        for period, stations in (menu_data or {}).items()
+        for station in stations
+        for option in station.get('options', [])
+        if option.get('meal')
+    ]
+    return _insert_rows(conn, rows)
+
+
+def archive_weekly_menu(conn, weekly_data: dict, week_start: datetime.date, today: datetime.date = None) -> int:
+    """
+    Archives the days of a weekly menu in the /api/weekly-menu format
+    ({day: {period: {station: ["meal | description", ...]}}}) up to and
+    including today. Later days are only planned, so they are archived by the
+    runs on or after them.
+
+    Args:
+        week_start (datetime.date): The first date of the week the menu
+                                    covers, as the weekly page gives it.
+        today (datetime.date): Defaults to the local date.
+
+    Returns:
+        int: The number of meals added.
+    """
+    today = today or datetime.date.today()
+    rows = []
+    for day, periods in (weekly_data or {}).items():
+        if day not in WEEKDAYS:
+            continue
+        days_in = (WEEKDAYS.index(day) - week_start.weekday()) % 7
+        served_on = week_start + datetime.timedelta(days=days_in)
+        if served_on > today:
+            continue
+        date = served_on.isoformat()
+        for period, stations in periods.items():
+            for station, meals in stations.items():
+                for entry in meals:
+                    meal, _, description = entry.partition(' | ')
+                    if meal.strip():
+                        rows.append((date, _normalize_period(period), station, meal.strip(), description.strip() or None))
+    return _insert_rows(conn, rows)
+
+
+def fts_query(text: str) -> str | None:
+    """
+    Turns free text into an FTS5 query: every word must match, and the last
+    one may be a prefix ("orange chick" finds "orange chicken"). Returns
+    None if `text` has no searchable words.
+    """
+    words = re.findall(r'\w+', text.lower())
+    if not words:
+        return None
+    return ' '.join(f'"{word}"' for word in words) + '*'
+
+
+def search(conn, text: str, station: str = None, limit: int = DEFAULT_SEARCH_LIMIT) -> list:
+    """
+    Finds archived meals whose name or description matches `text`, most
+    recently served first.
+
+    Args:
+        station (str): Only return meals from this station (case-insensitive).
+
+    Returns:
+        list: [{date, period, station, meal, description}, ...]
+    """
+    query = fts_query(text)
+    if query is None:
+        return []
+
+    sql = '''
+        SELECT a.date, a.period, a.station, a.meal, a.description
+        FROM menu_archive_fts
+        JOIN menu_archive a ON a.id = menu_archive_fts.rowid
+        WHERE menu_archive_fts MATCH ?
+    '''
+    params = [query]
+    if station:
+        sql += ' AND a.station = ? COLLATE NOCASE'
+        params.append(station)
+    sql += ' ORDER BY menu_archive_fts.rowid DESC LIMIT ?'
+    params.append(max(1, min(limit, MAX_SEARCH_LIMIT)))
+    return [dict(row) for row in conn.execute(sql, params)]
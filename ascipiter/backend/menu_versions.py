@@ -0,0 +1,138 @@
+# menu_versions.py
+#
+# Recent versions of the cached menus, by content hash, and the patches
+# between them. A client that sends the version it holds to
+# /api/menu/refresh gets back only what changed: a list of JSON Patch
+# (RFC 6902) add/remove/replace operations, with stations matched by name
+# and options by meal, so an added or removed option is one small operation.
+
+import collections
+import json
+import os
+import threading
+
+# --- Configuration ---
+# Versions kept per menu; a client holding an older one gets the full menu.
+MENU_HISTORY_SIZE = int(os.environ.get('MENU_HISTORY_SIZE', 8))
+
+# Fields that identify the dicts in a list (stations by name, options by
+# meal), so lists can be diffed item by item. Lists of strings (the weekly
+# menu's options) are matched by the strings themselves.
+IDENTITY_FIELDS = ('name', 'meal')
+
+
+def _pointer(path: str, key) -> str:
+    return f"{path}/{str(key).replace('~', '~0').replace('/', '~1')}"
+
+
+def _identity(items: list):
+    """How a list's items are told apart, or None if they can't be matched up."""
+    if all(isinstance(item, str) for item in items):
+        return lambda item: item
+    for field in IDENTITY_FIELDS:
+        if all(isinstance(item, dict) and field in item for item in items):
+            return lambda item, field=field: item[field]
+    return None
+
+
+def _diff_list(old: list, new: list, path: str):
+    """Patch operations turning list `old` into `new`, or None to replace it whole."""
+    identity = _identity(old + new)
+    if identity is None:
+        return None
+    old_ids, new_ids = [identity(item) for item in old], [identity(item) for item in new]
+    old_index = {item_id: i for i, item_id in enumerate(old_ids)}
+    new_set = set(new_ids)
+    kept_in_old_order = [item_id for item_id in old_ids if item_id in new_set]
+    kept_in_new_order = [item_id for item_id in new_ids if item_id in old_index]
+    if len(old_index) != len(old) or len(new_set) != len(new) or kept_in_old_order != kept_in_new_order:
+        return None # Duplicates or reordering: not worth expressing as moves
+
+    # Removals run from the end so the indices still to come stay valid...
+    ops = [{'op': 'remove', 'path': _pointer(path, i)} for i in reversed(range(len(old))) if old_ids[i] not in new_set]
+    # ...after which the list holds the kept items, in order, and each new
+    # item can be added (or a kept one patched) at its final index.
+    for i, (item_id, item) in enumerate(zip(new_ids, new)):
+        if item_id in old_index:
+            ops += diff(old[old_index[item_id]], item, _pointer(path, i))
+        else:
+            ops.append({'op': 'add', 'path': _pointer(path, i), 'value': item})
+    return ops
+
+
+def diff(old, new, path: str = '') -> list:
+    """
+    JSON Patch operations that turn `old` into `new`, applied in order.
+
+    Returns:
+        list: [{'op', 'path'[, 'value']}]; empty if they are equal.
+    """
+    if old == new:
+        return []
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops = [{'op': 'remove', 'path': _pointer(path, key)} for key in old if key not in new]
+        for key, value in new.items():
+            if key in old:
+                ops += diff(old[key], value, _pointer(path, key))
+            else:
+                ops.append({'op': 'add', 'path': _pointer(path, key), 'value': value})
+        return ops
+    if isinstance(old, list) and isinstance(new, list):
+        ops = _diff_list(old, new, path)
+        if ops is not None:
+            return ops
+    return [{'op': 'replace', 'path': path, 'value': new}]
+
+
+class VersionHistory:
+    """
+    The last MENU_HISTORY_SIZE versions of each menu, by content hash, and
+    the patches already computed from them to the current version, so
+    clients holding the same old version share one diff.
+    """
+
+    def __init__(self, size: int = MENU_HISTORY_SIZE):
+        self.size = size
+        self._versions = {} # key -> OrderedDict of hash -> payload, oldest first
+        self._patches = {} # (key, from hash, to hash) -> encoded patch or None
+        self._lock = threading.Lock()
+
+    def record(self, key: str, version_hash: str, payload):
+        with self._lock:
+            versions = self._versions.setdefault(key, collections.OrderedDict())
+            if version_hash in versions:
+                return
+            versions[version_hash] = payload
+            while len(versions) > self.size:
+                versions.popitem(last=False)
+            # Patches only ever lead to the current version
+            self._patches = {k: v for k, v in self._patches.items() if k[0] != key}
+
+    def patch(self, key: str, from_hash: str, to_hash: str, max_bytes: int = None):
+        """
+        The patch from version `from_hash` to `to_hash` of `key`, JSON-encoded.
+
+        Args:
+            max_bytes (int): Give up (return None) if the patch is at least this
+                             big, e.g. the size of the full payload.
+
+        Returns:
+            bytes | None: None if either version isn't in the history or the
+                          patch isn't smaller than `max_bytes`.
+        """
+        cache_key = (key, from_hash, to_hash)
+        with self._lock:
+            if cache_key in self._patches:
+                return self._patches[cache_key]
+            versions = self._versions.get(key, {})
+            if from_hash not in versions or to_hash not in versions:
+                return None
+            old, new = versions[from_hash], versions[to_hash]
+
+        encoded = json.dumps(diff(old, new), separators=(',', ':')).encode()
+        if max_bytes is not None and len(encoded) >= max_bytes:
+            encoded = None
+        with self._lock:
+            if to_hash in self._versions.get(key, {}):
+                self._patches[cache_key] = encoded
+        return encoded
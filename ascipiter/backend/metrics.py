@@ -0,0 +1,220 @@
+# metrics.py
+#
+# Counters and histograms, rendered in the Prometheus text format by
+# server.py's /metrics endpoint. Recording a value is a dict lookup and a
+# bisect under a per-metric lock. Each worker process buffers its deltas in
+# memory and flush() adds them to a shared SQLite table (METRICS_MIGRATIONS in
+# db.py), so /metrics reports the totals of every worker whichever one
+# answers. Quantiles are only estimated when scraped.
+
+import bisect
+import collections
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+# --- Configuration ---
+# Upper bounds (seconds) of the latency histogram buckets.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Quantiles estimated from each histogram's buckets and exported next to it.
+QUANTILES = (0.5, 0.95, 0.99)
+
+_registry = [] # Every metric, in the order it was created
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """
+    Values not yet flushed, per combination of label values. Each series is a
+    list of `series_length` numbers; flush() adds them to the shared table
+    field by field (the list index).
+    """
+
+    series_length = 1
+
+    def __init__(self, name, documentation, label_names=()):
+        self.name, self.documentation, self.label_names = name, documentation, tuple(label_names)
+        self._pending = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _series(self, label_values):
+        # Callers hold self._lock
+        series = self._pending.get(label_values)
+        if series is None:
+            series = self._pending[label_values] = [0] * self.series_length
+        return series
+
+    def drain(self) -> dict:
+        """Takes the unflushed values: label values -> series."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return pending
+
+    def restore(self, pending: dict):
+        """Puts back values drain() took, e.g. after a failed flush."""
+        with self._lock:
+            for label_values, values in pending.items():
+                series = self._series(label_values)
+                for i, value in enumerate(values):
+                    series[i] += value
+
+
+class Counter(_Metric):
+    """A monotonically increasing count per combination of label values."""
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._series(label_values)[0] += amount
+
+    def render(self, series: dict):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        lines += [f'{self.name}{_format_labels(self.label_names, labels)} {_format_value(values[0])}' for labels, values in sorted(series.items())]
+        return lines
+
+
+class Histogram(_Metric):
+    """
+    Observations bucketed per combination of label values. Rendered as a
+    Prometheus histogram plus a `<name>_quantile` gauge with p50/p95/p99
+    estimated by interpolating within the buckets.
+    """
+
+    def __init__(self, name, documentation, label_names=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.series_length = len(self.buckets) + 2 # bucket counts..., +Inf count, sum
+        super().__init__(name, documentation, label_names)
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series(label_values)
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, *label_values):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *label_values)
+
+    def _quantile(self, counts, total, q):
+        # Same linear interpolation as PromQL's histogram_quantile()
+        rank = q * total
+        cumulative = 0
+        for i, count in enumerate(counts):
+            if cumulative + count >= rank and count:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - cumulative) / count
+            cumulative += count
+        return 0.0
+
+    def render(self, series: dict):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        quantile_lines = [f'# HELP {self.name}_quantile {self.documentation} Quantiles estimated from the buckets.', f'# TYPE {self.name}_quantile gauge']
+        for labels, values in sorted(series.items()):
+            counts, total_sum = values[:-1], values[-1]
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), counts):
+                cumulative += count
+                le = bound if bound == '+Inf' else _format_value(float(bound))
+                lines.append(f'{self.name}_bucket{_format_labels(self.label_names, labels, [("le", le)])} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.label_names, labels)} {_format_value(float(total_sum))}')
+            lines.append(f'{self.name}_count{_format_labels(self.label_names, labels)} {cumulative}')
+            for q in QUANTILES:
+                estimate = self._quantile(counts, cumulative, q)
+                quantile_lines.append(f'{self.name}_quantile{_format_labels(self.label_names, labels, [("quantile", q)])} {_format_value(estimate)}')
+        return lines + quantile_lines
+
+
+def flush(conn):
+    """
+    Adds this process's unflushed values to the metric_values table. If the
+    write fails they are kept for the next flush and the error is raised.
+    """
+    drained = [(metric, metric.drain()) for metric in _registry]
+    rows = [
+        (metric.name, json.dumps(labels), field, value)
+        for metric, pending in drained
+        for labels, values in pending.items()
+        for field, value in enumerate(values) if value
+    ]
+    if not rows:
+        return
+    try:
+        with conn:
+            conn.executemany('''
+                INSERT INTO metric_values (name, labels, field, value) VALUES (?, ?, ?, ?)
+                ON CONFLICT(name, labels, field) DO UPDATE SET value = value + excluded.value
+            ''', rows)
+    except sqlite3.Error:
+        for metric, pending in drained:
+            metric.restore(pending)
+        raise
+
+
+def render_all(conn) -> str:
+    """Every metric, totalled across all processes, in the Prometheus text exposition format."""
+    flush(conn)
+    by_name = {metric.name: metric for metric in _registry}
+    series = collections.defaultdict(dict) # name -> label values -> values
+    for row in conn.execute('SELECT name, labels, field, value FROM metric_values'):
+        metric = by_name.get(row['name'])
+        if metric is None or not 0 <= row['field'] < metric.series_length:
+            continue # Written by an older version of this file
+        values = series[metric.name].setdefault(tuple(json.loads(row['labels'])), [0] * metric.series_length)
+        values[row['field']] = row['value']
+
+    lines = []
+    for metric in _registry:
+        lines += metric.render(series.get(metric.name, {}))
+    return '\n'.join(lines) + '\n'
+
+
+# --- Metrics ---
+HTTP_REQUESTS = Counter('ascipiter_http_requests_total', 'HTTP requests handled.', ('route', 'method', 'status'))
+HTTP_LATENCY = Histogram('ascipiter_http_request_duration_seconds', 'Time spent handling HTTP requests.', ('route',))
+CACHE_LOOKUPS = Counter('ascipiter_response_cache_lookups_total', 'Cached JSON response lookups by result (hit/miss).', ('cache', 'result'))
+RESPONSE_BYTES = Counter('ascipiter_response_cache_bytes_total', 'Body bytes sent from the response cache, by content encoding.', ('cache', 'encoding'))
+DB_QUERY_LATENCY = Histogram('ascipiter_db_query_duration_seconds', 'Time spent in SQLite queries and transactions.', ('operation',))
+JOB_DURATION = Histogram('ascipiter_job_duration_seconds', 'Background job run time.', ('job',))
+JOB_RUNS = Counter('ascipiter_job_runs_total', 'Background job runs by result (success/failure/dropped).', ('job', 'result'))
+UPSTREAM_REQUESTS = Counter('ascipiter_upstream_requests_total', 'Upstream GET attempts by host and result (success/failure).', ('host', 'result'))
+UPSTREAM_LATENCY = Histogram('ascipiter_upstream_request_duration_seconds', 'Time spent on upstream GET attempts.', ('host',))
+EVENT_STREAMS = Counter('ascipiter_event_streams_total', '/api/events streams by result (opened/rejected).', ('result',))
+
+
+def record_job(name: str, seconds: float, succeeded: bool):
+    JOB_DURATION.observe(seconds, name)
+    JOB_RUNS.inc(name, 'success' if succeeded else 'failure')
+
+
+def timed_job(name: str, func):
+    """Wraps a scheduler job so its run time and outcome are recorded."""
+    def run():
+        started = time.perf_counter()
+        succeeded = False
+        try:
+            result = func()
+            succeeded = result is not False
+            return result
+        finally:
+            record_job(name, time.perf_counter() - started, succeeded)
+    return run
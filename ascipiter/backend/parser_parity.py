@@ -0,0 +1,85 @@
+# parser_parity.py
+#
+# Checks that the configured HTML backend and scoped parsing (see
+# html_parsing.py) produce exactly the same structured output as a full
+# 'html.parser' parse of the same saved pages.
+#
+# Usage:
+#   SCRAPER_HTML_PARSER=lxml python parser_parity.py
+#   SCRAPER_HTML_PARSER=lxml python parser_parity.py --print-menu print.html --weekly weekly.html
+#
+# With no pages given, the saved pages in benchmarks/fixtures/ are checked.
+#
+# Exits with status 1 if any output differs.
+
+import argparse
+import json
+import os
+import sys
+
+import html_parsing
+from scrape_menu import TARGET_STATIONS, parse_structured_menu
+from scrape_weekly import find_weekly_menu_url_in_html, parse_weekly_menu
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks', 'fixtures')
+DEFAULT_PAGES = {
+    'print_menu': [os.path.join(FIXTURES_DIR, 'print_menu.html')],
+    'weekly': [os.path.join(FIXTURES_DIR, 'weekly_menu.html')],
+    'cafe': [os.path.join(FIXTURES_DIR, 'cafe_page.html')],
+}
+
+# Page kind -> function turning the saved HTML into structured output.
+PAGE_PARSERS = {
+    'print_menu': lambda html: parse_structured_menu(html, TARGET_STATIONS),
+    'weekly': parse_weekly_menu,
+    'cafe': find_weekly_menu_url_in_html,
+}
+
+
+def _run_with(parser: str, scoped: bool, parse, html):
+    saved = (html_parsing.HTML_PARSER, html_parsing.SCOPED_PARSING)
+    html_parsing.HTML_PARSER, html_parsing.SCOPED_PARSING = parser, scoped
+    try:
+        return parse(html)
+    finally:
+        html_parsing.HTML_PARSER, html_parsing.SCOPED_PARSING = saved
+
+
+def check_parity(kind: str, html: bytes, parser: str, scoped: bool) -> bool:
+    """Returns True if `parser`/`scoped` output matches the full html.parser output."""
+    parse = PAGE_PARSERS[kind]
+    reference = _run_with('html.parser', False, parse, html)
+    candidate = _run_with(parser, scoped, parse, html)
+    if reference == candidate:
+        print(f"OK    {kind}: {parser} (scoped={scoped}) matches html.parser")
+        return True
+
+    print(f"FAIL  {kind}: {parser} (scoped={scoped}) differs from html.parser")
+    print("  expected: " + json.dumps(reference, sort_keys=True)[:2000])
+    print("  actual:   " + json.dumps(candidate, sort_keys=True)[:2000])
+    return False
+
+
+def main(argv=None) -> int:
+    arg_parser = argparse.ArgumentParser(description="Check scraper output parity against a full html.parser parse.")
+    arg_parser.add_argument('--print-menu', dest='print_menu', nargs='*', default=[], help="Saved print menu pages")
+    arg_parser.add_argument('--weekly', nargs='*', default=[], help="Saved weekly menu pages")
+    arg_parser.add_argument('--cafe', nargs='*', default=[], help="Saved cafe landing pages")
+    arg_parser.add_argument('--parser', default=html_parsing.HTML_PARSER, help="Backend to check (default: configured one)")
+    arg_parser.add_argument('--unscoped', action='store_true', help="Check the backend without scoped parsing")
+    args = arg_parser.parse_args(argv)
+
+    pages = {kind: getattr(args, kind) for kind in PAGE_PARSERS}
+    if not any(pages.values()):
+        pages = DEFAULT_PAGES
+
+    ok = True
+    for kind, paths in pages.items():
+        for path in paths:
+            with open(path, 'rb') as f:
+                ok = check_parity(kind, f.read(), args.parser, not args.unscoped) and ok
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,214 @@
+# profiling.py
+#
+# Opt-in profiler for live requests and scheduler jobs. When enabled, a
+# random SAMPLE_RATE fraction of them is profiled, either with cProfile or by
+# sampling the thread's stack every PROFILE_SAMPLE_INTERVAL_MS, and the
+# PROFILE_KEEP slowest profiles are kept for download (see server.py's
+# /api/admin/profiles endpoints). Profiles are kept in a database shared by
+# every worker process (see use_database()), so any worker can list and serve
+# them. Off by default; when off, start() is a single comparison.
+#
+# Both modes assume one request per OS thread, so profiling stays off in
+# gevent workers. Greenlets sharing a thread would mix their calls into one
+# cProfile, and the sampler finds stacks by thread ident, which no greenlet has.
+
+import cProfile
+import collections
+import logging
+import marshal
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+
+# --- Configuration ---
+# Fraction of requests/jobs to profile, 0 (off) to 1. Also settable at runtime.
+SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+# 'cprofile' (exact call counts, downloadable as pstats) or 'sample'
+# (stack samples, downloadable as collapsed stacks for flamegraphs).
+MODE = os.environ.get('PROFILE_MODE', 'cprofile')
+# How many of the slowest profiles to keep.
+KEEP = int(os.environ.get('PROFILE_KEEP', 20))
+# Stack sampling interval in 'sample' mode.
+PROFILE_SAMPLE_INTERVAL_MS = float(os.environ.get('PROFILE_SAMPLE_INTERVAL_MS', 5))
+
+MODES = ('cprofile', 'sample')
+_ENV_SETTINGS = {'sample_rate': SAMPLE_RATE, 'mode': MODE, 'keep': KEEP} # What reset() restores
+
+_db = None # ConnectionPool holding the profiles table (METRICS_MIGRATIONS in db.py)
+
+# 'sample' mode: thread ident -> Counter of collapsed stacks for the profile
+# running on it, filled in by one shared sampler thread.
+_sampled_threads = {}
+_sampled_threads_lock = threading.Lock()
+_sampler = None
+_warned_greenlets = False
+
+
+def use_database(pool):
+    """Keeps profiles in `pool`'s database; call before enabling profiling."""
+    global _db
+    _db = pool
+
+
+def configure(sample_rate: float = None, mode: str = None, keep: int = None):
+    """Changes the profiling settings at runtime; None leaves a setting as is."""
+    global SAMPLE_RATE, MODE, KEEP
+    if mode is not None:
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {', '.join(MODES)}")
+        MODE = mode
+    if sample_rate is not None:
+        if not 0 <= sample_rate <= 1:
+            raise ValueError("sample_rate must be between 0 and 1")
+        SAMPLE_RATE = sample_rate
+    if keep is not None:
+        if keep < 1:
+            raise ValueError("keep must be at least 1")
+        KEEP = keep
+    logging.info(f"Profiling settings: sample_rate={SAMPLE_RATE} mode={MODE} keep={KEEP}")
+
+
+def reset():
+    """Goes back to the settings from the environment."""
+    configure(**_ENV_SETTINGS)
+
+
+def settings() -> dict:
+    return {'sampleRate': SAMPLE_RATE, 'mode': MODE, 'keep': KEEP}
+
+
+# --- Stack Sampler ---
+def _collapse(frame) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def _sample_stacks():
+    interval = PROFILE_SAMPLE_INTERVAL_MS / 1000
+    while True:
+        time.sleep(interval)
+        # Held for the whole pass so stop() never sees a half-updated Counter
+        with _sampled_threads_lock:
+            if not _sampled_threads:
+                continue
+            frames = sys._current_frames()
+            for thread_id, stacks in _sampled_threads.items():
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    stacks[_collapse(frame)] += 1
+
+
+def _ensure_sampler():
+    global _sampler
+    with _sampled_threads_lock:
+        if _sampler is None:
+            _sampler = threading.Thread(target=_sample_stacks, name='profile-sampler', daemon=True)
+            _sampler.start()
+
+
+def _greenlet_threads() -> bool:
+    """Whether gevent has patched threading, so requests run as greenlets."""
+    gevent_monkey = sys.modules.get('gevent.monkey')
+    return gevent_monkey is not None and gevent_monkey.is_module_patched('threading')
+
+
+# --- Capturing ---
+def start(name: str):
+    """
+    Starts profiling the current thread if this call is sampled.
+
+    Returns:
+        dict | None: A token to pass to stop(), or None if not sampled.
+    """
+    global _warned_greenlets
+    if SAMPLE_RATE <= 0 or random.random() >= SAMPLE_RATE:
+        return None
+    if _greenlet_threads():
+        if not _warned_greenlets:
+            logging.warning("Profiling is unavailable in gevent workers; use GUNICORN_WORKER_CLASS=gthread.")
+            _warned_greenlets = True
+        return None
+
+    token = {'name': name, 'mode': MODE, 'started': time.perf_counter()}
+    if MODE == 'cprofile':
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Only one cProfile can be active at a time on newer Pythons
+            return None
+        token['profiler'] = profiler
+    else:
+        _ensure_sampler()
+        token['thread'] = threading.get_ident()
+        token['stacks'] = collections.Counter()
+        with _sampled_threads_lock:
+            _sampled_threads[token['thread']] = token['stacks']
+    return token
+
+
+def stop(token):
+    """Stops a profile started by start() and keeps it if it's among the slowest."""
+    if token is None:
+        return
+    duration = time.perf_counter() - token['started']
+    if token['mode'] == 'cprofile':
+        profiler = token['profiler']
+        profiler.disable()
+        profiler.create_stats()
+        data = marshal.dumps(profiler.stats) # The file format pstats.Stats() / snakeviz read
+    else:
+        with _sampled_threads_lock:
+            _sampled_threads.pop(token['thread'], None)
+        # Collapsed stacks ("a;b;c count" lines) for flamegraph.pl / speedscope
+        data = ''.join(f"{stack} {count}\n" for stack, count in token['stacks'].most_common()).encode()
+
+    if _db is None:
+        return
+    try:
+        with _db.connection() as conn, conn:
+            conn.execute('INSERT INTO profiles (name, mode, duration, captured_at, data) VALUES (?, ?, ?, ?, ?)',
+                         (token['name'], token['mode'], duration, time.time(), data))
+            conn.execute('DELETE FROM profiles WHERE id NOT IN (SELECT id FROM profiles ORDER BY duration DESC LIMIT ?)', (KEEP,))
+    except sqlite3.Error as e:
+        logging.error(f"Could not save profile of {token['name']}: {e}")
+
+
+def run_profiled(name: str, func):
+    """Calls func(), profiling it if sampled. Used for scheduler jobs."""
+    token = start(name)
+    try:
+        return func()
+    finally:
+        stop(token)
+
+
+# --- Reading Profiles ---
+def list_profiles() -> list:
+    """The kept profiles, slowest first, without their data."""
+    if _db is None:
+        return []
+    with _db.connection() as conn:
+        rows = conn.execute('SELECT id, name, mode, duration, captured_at FROM profiles ORDER BY duration DESC LIMIT ?', (KEEP,)).fetchall()
+    return [{'id': row['id'], 'name': row['name'], 'mode': row['mode'], 'duration': row['duration'], 'capturedAt': row['captured_at']}
+            for row in rows]
+
+
+def get_profile(profile_id: int):
+    """
+    Returns:
+        dict | None: {'id', 'name', 'mode', 'data'} where `data` is the
+                     downloadable file for the profile's mode.
+    """
+    if _db is None:
+        return None
+    with _db.connection() as conn:
+        row = conn.execute('SELECT id, name, mode, data FROM profiles WHERE id = ?', (profile_id,)).fetchone()
+    return dict(row) if row else None
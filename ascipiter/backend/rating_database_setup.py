@@ -1,31 +1,15 @@
-import sqlite3
+from db import connect, run_migrations, RATINGS_MIGRATIONS
 
-# This will create a new 'ratings.db' file
-conn = sqlite3.connect('ratings.db')
-cursor = conn.cursor()
+# This will create a new 'ratings.db' file.
+# The server applies the same migrations on startup, so running this is optional.
+conn = connect('ratings.db')
 
 print("Initializing ratings database...")
 
-# Create the 'ratings' table for aggregated scores (no changes here)
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS ratings (
-    mealId TEXT PRIMARY KEY,
-    totalStars INTEGER NOT NULL DEFAULT 0,
-    ratingCount INTEGER NOT NULL DEFAULT 0
-)
-''')
+# Create the 'ratings' table for aggregated scores and the 'voters' table
+# that stores each user's specific rating (see RATINGS_MIGRATIONS in db.py)
+run_migrations(conn, RATINGS_MIGRATIONS)
 
-# UPDATED: Create the 'voters' table to store each user's specific rating
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS voters (
-    mealId TEXT NOT NULL,
-    anonymousId TEXT NOT NULL,
-    rating INTEGER NOT NULL, -- This new column stores the user's vote
-    PRIMARY KEY (mealId, anonymousId)
-)
-''')
-
-conn.commit()
 conn.close()
 
-print("Ratings database initialized successfully.")
\ No newline at end of file
+print("Ratings database initialized successfully.")
@@ -0,0 +1,178 @@
+# rating_store.py
+
+import logging
+import os
+import threading
+
+from leaderboard import Leaderboard
+
+# --- Configuration ---
+# Votes kept in vote_log for processes that haven't caught up with them yet;
+# a process that falls further behind reloads the tables instead.
+RATINGS_LOG_SIZE = int(os.environ.get('RATINGS_LOG_SIZE', 10000))
+
+
+class RatingStore:
+    """
+    An in-memory copy of ratings.db: the `ratings` aggregates and the
+    `voters` table keyed by (mealId, anonymousId).
+
+    It is loaded once at startup and kept in step with the tables by
+    rate_meal, which holds `write_lock` across its transaction and calls
+    apply_vote() after committing. Votes committed by other processes are
+    read back from vote_log by catch_up(). Rating reads never touch the
+    database. The top-rated leaderboard is updated with each vote as well.
+    """
+
+    def __init__(self):
+        self._aggregates = {} # mealId -> [totalStars, ratingCount]
+        self._voters = {}     # (mealId, anonymousId) -> rating
+        self._leaderboard = Leaderboard()
+        self._lock = threading.Lock() # guards the dicts and the leaderboard
+        # Held by writers across the DB transaction and apply_vote(), so
+        # votes reach memory in the same order they were committed.
+        self.write_lock = threading.Lock()
+        # Id of the last vote_log row reflected in memory
+        self.log_position = 0
+
+    def load(self, conn):
+        """Replaces the in-memory state with the current contents of the tables. Callers hold write_lock."""
+        # One snapshot of both tables and the log position (rate_meal may
+        # call this with its own transaction already open)
+        own_transaction = not conn.in_transaction
+        if own_transaction:
+            conn.execute('BEGIN')
+        try:
+            position = conn.execute('SELECT COALESCE(MAX(id), 0) FROM vote_log').fetchone()[0]
+            aggregates = {row['mealId']: [row['totalStars'], row['ratingCount']] for row in conn.execute('SELECT * FROM ratings')}
+            voters = {(row['mealId'], row['anonymousId']): row['rating'] for row in conn.execute('SELECT * FROM voters')}
+        finally:
+            if own_transaction:
+                conn.commit()
+        with self._lock:
+            self.log_position = position
+            self._aggregates, self._voters = aggregates, voters
+            self._leaderboard.clear()
+            for meal_id, (total_stars, rating_count) in aggregates.items():
+                self._leaderboard.update(meal_id, total_stars, rating_count)
+        logging.info(f"Loaded {len(aggregates)} rating aggregates and {len(voters)} votes into memory.")
+
+    def get(self, meal_id, anonymous_id):
+        """
+        Returns:
+            tuple: (totalStars, ratingCount, user_rating). The counts are 0 for
+                   unrated meals and user_rating is None if the caller hasn't voted.
+        """
+        with self._lock:
+            total_stars, rating_count = self._aggregates.get(meal_id, (0, 0))
+            return total_stars, rating_count, self._voters.get((meal_id, anonymous_id))
+
+    def get_many(self, meal_ids, anonymous_id):
+        """get() for several meals under one lock acquisition: mealId -> tuple."""
+        with self._lock:
+            return {
+                meal_id: (*self._aggregates.get(meal_id, (0, 0)), self._voters.get((meal_id, anonymous_id)))
+                for meal_id in meal_ids
+            }
+
+    def log_vote(self, conn, meal_id, anonymous_id, new_rating) -> int:
+        """
+        Appends a vote to vote_log inside rate_meal's transaction and trims
+        the log to RATINGS_LOG_SIZE rows.
+
+        Returns:
+            int: The vote's log id, to pass to apply_vote() after committing.
+        """
+        log_id = conn.execute('INSERT INTO vote_log (mealId, anonymousId, rating) VALUES (?, ?, ?)',
+                              (meal_id, anonymous_id, new_rating)).lastrowid
+        conn.execute('DELETE FROM vote_log WHERE id <= ?', (log_id - RATINGS_LOG_SIZE,))
+        return log_id
+
+    def catch_up(self, conn) -> int:
+        """
+        Applies the votes logged by other processes since this copy was last
+        in step with vote_log. Callers hold write_lock. If the log has been
+        trimmed past them the tables are reloaded instead.
+
+        Returns:
+            int: The number of votes applied.
+        """
+        rows = conn.execute('SELECT id, mealId, anonymousId, rating FROM vote_log WHERE id > ? ORDER BY id',
+                            (self.log_position,)).fetchall()
+        if not rows:
+            return 0
+        # Ids are consecutive: a vote's log row commits or rolls back with it
+        if rows[0]['id'] != self.log_position + 1:
+            logging.warning(f"vote_log no longer reaches back to vote {self.log_position}; reloading ratings.")
+            self.load(conn)
+            return len(rows)
+        for row in rows:
+            self.apply_vote(row['mealId'], row['anonymousId'], row['rating'], row['id'])
+        return len(rows)
+
+    def apply_vote(self, meal_id, anonymous_id, new_rating, log_id=None):
+        """
+        Mirrors a committed rate_meal write: a new vote, a changed vote, or a
+        removed vote when `new_rating` is 0. `log_id` is the vote's vote_log id.
+        """
+        key = (meal_id, anonymous_id)
+        with self._lock:
+            if log_id is not None:
+                self.log_position = log_id
+            old_rating = self._voters.get(key)
+            if new_rating == 0:
+                if old_rating is None:
+                    return
+                del self._voters[key]
+                aggregate = self._aggregates[meal_id]
+                aggregate[0] -= old_rating
+                aggregate[1] -= 1
+            elif old_rating is not None:
+                self._voters[key] = new_rating
+                aggregate = self._aggregates[meal_id]
+                aggregate[0] += new_rating - old_rating
+            else:
+                self._voters[key] = new_rating
+                aggregate = self._aggregates.setdefault(meal_id, [0, 0])
+                aggregate[0] += new_rating
+                aggregate[1] += 1
+            self._leaderboard.update(meal_id, *aggregate)
+
+    def top(self, limit, station=None, min_votes=1):
+        """
+        The best meals by Bayesian average; see Leaderboard.top().
+
+        Returns:
+            list: [(mealId, score, totalStars, ratingCount), ...]
+        """
+        with self._lock:
+            return [
+                (meal_id, score, self._aggregates[meal_id][0], rating_count)
+                for meal_id, score, rating_count in self._leaderboard.top(limit, station, min_votes)
+            ]
+
+    def check_consistency(self, conn) -> dict:
+        """
+        Compares the in-memory state with the tables.
+
+        Returns:
+            dict: 'ratings' and 'voters' lists of {key, memory, database} for
+                  every entry that differs. Both are empty when in sync.
+        """
+        # Read both tables in one snapshot while no vote can be half-applied
+        with self.write_lock:
+            with conn:
+                conn.execute('BEGIN')
+                db_aggregates = {row['mealId']: [row['totalStars'], row['ratingCount']] for row in conn.execute('SELECT * FROM ratings')}
+                db_voters = {(row['mealId'], row['anonymousId']): row['rating'] for row in conn.execute('SELECT * FROM voters')}
+            with self._lock:
+                aggregates = {meal_id: list(aggregate) for meal_id, aggregate in self._aggregates.items()}
+                voters = dict(self._voters)
+
+        def diff(memory, database):
+            return [
+                {'key': key, 'memory': memory.get(key), 'database': database.get(key)}
+                for key in memory.keys() | database.keys()
+                if memory.get(key) != database.get(key)
+            ]
+        return {'ratings': diff(aggregates, db_aggregates), 'voters': diff(voters, db_voters)}
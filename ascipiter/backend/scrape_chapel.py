@@ -1,44 +1,82 @@
 # backend/scrape_chapel.py
 
+import os
+import re
 import requests
-from bs4 import BeautifulSoup
-from datetime import datetime # Import the datetime module
+from datetime import datetime, timedelta # Import the datetime module
+from zoneinfo import ZoneInfo
+
+import http_client
+from html_parsing import make_soup, CHAPEL_STRAINER
+
+CHAPEL_URL = 'https://www.biola.edu/chapel'
+# The chapel page lists local times without a year or timezone.
+CHAPEL_TIMEZONE = ZoneInfo(os.environ.get('CHAPEL_TIMEZONE', 'America/Los_Angeles'))
+
+# e.g. "Fri, Sep 26, 9:30 AM" (the weekday is optional)
+EVENT_TIME_PATTERN = re.compile(r'^(?:\w+,?\s+)?([A-Za-z]{3})\w*\.?\s+(\d{1,2}),?\s+(\d{1,2}):(\d{2})\s*([AaPp][Mm])')
+# A date this far from now is taken to be in the neighbouring year, so a
+# term that spans New Year's keeps its January events in the future.
+YEAR_ROLLOVER = timedelta(days=183)
+
+
+def parse_event_time(text, now=None):
+    """
+    Parses the chapel page's time text into an aware datetime.
+
+    Args:
+        text (str): e.g. "Fri, Sep 26, 9:30 AM".
+        now (datetime): Reference for the missing year; defaults to now.
+
+    Returns:
+        datetime or None: The start time in CHAPEL_TIMEZONE, or None if `text` doesn't parse.
+    """
+    match = EVENT_TIME_PATTERN.match(' '.join(text.split()))
+    if not match:
+        return None
+    month, day, hour, minute, meridiem = match.groups()
+    now = now or datetime.now(CHAPEL_TIMEZONE)
+    try:
+        start = datetime.strptime(f"{month} {day} {now.year} {hour}:{minute} {meridiem.upper()}", '%b %d %Y %I:%M %p')
+    except ValueError:
+        return None
+
+    start = start.replace(tzinfo=CHAPEL_TIMEZONE)
+    if start < now - YEAR_ROLLOVER:
+        start = start.replace(year=now.year + 1)
+    elif start > now + YEAR_ROLLOVER:
+        start = start.replace(year=now.year - 1)
+    return start
 
 def get_chapel_events():
     """
-    Scrapes chapel events from the Biola University website and returns them 
-    as a list of dictionaries.
+    Scrapes chapel events from the Biola University website and returns them
+    as a list of dictionaries, sorted by start time. Each has 'title',
+    'description', 'time' (display text), 'start' (ISO 8601) and 'timestamp'
+    (Unix seconds); the last two are None if the time couldn't be parsed.
     """
-    url = 'https://www.biola.edu/chapel'
+    url = CHAPEL_URL
     chapel_events = []
-    
-    # Get the current year to append to the date string
-    current_year = datetime.now().year
+    now = datetime.now(CHAPEL_TIMEZONE)
 
     try:
-        # --- FIX: Added a 15-second timeout to prevent the app from hanging ---
-        response = requests.get(url, timeout=15)
+        # Timeout and retries come from the shared client so the app can't hang
+        response = http_client.get(url)
         response.raise_for_status()
 
-        soup = BeautifulSoup(response.text, 'html.parser')
+        soup = make_soup(response.text, CHAPEL_STRAINER)
         event_lists = soup.find_all('ul', class_='chapel-list')
 
         for event_list in event_lists:
             events = event_list.find_all('li')
             for event in events:
                 time_tag = event.find('div', class_='datetime')
-                raw_time_text = time_tag.get_text(separator=' ').strip().replace('\n', ' ') if time_tag else 'Time not available'
-                
-                # Clean up multiple spaces and add the year to create a full date string
-                if raw_time_text != 'Time not available':
-                    cleaned_time_text = ' '.join(raw_time_text.split()) # Normalizes whitespace
-                    parts = cleaned_time_text.split()
-                    
-                    # Reconstruct the string with the current year and "at" for reliable parsing
-                    if len(parts) > 2:
-                        time = f"{parts[0]} {parts[1]} {parts[2]}, {current_year} at {' '.join(parts[3:])}"
-                    else:
-                        time = 'Time not available'
+                raw_time_text = time_tag.get_text(separator=' ') if time_tag else ''
+                start = parse_event_time(raw_time_text, now)
+
+                # Display text as before, e.g. "Fri, Sep 26, 2025 at 9:30 AM"
+                if start:
+                    time = f"{start:%a, %b} {start.day}, {start.year} at {start:%I:%M %p}".replace(' at 0', ' at ')
                 else:
                     time = 'Time not available'
 
@@ -51,9 +89,13 @@ def get_chapel_events():
                 chapel_events.append({
                     'title': title,
                     'description': description,
-                    'time': time
+                    'time': time,
+                    'start': start.isoformat() if start else None,
+                    'timestamp': int(start.timestamp()) if start else None, # Unix seconds
                 })
-                
+
+        # Sorted by start time (untimed events last) so readers can binary search it
+        chapel_events.sort(key=lambda e: (e['timestamp'] is None, e['timestamp'] or 0))
         return chapel_events
 
     except requests.exceptions.RequestException as e:
@@ -0,0 +1,118 @@
+# scrape_executor.py
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import http_client
+import metrics
+import profiling
+
+# --- Configuration ---
+# Scrape jobs for independent sources run side by side on this many threads.
+MAX_WORKERS = int(os.environ.get('SCRAPE_MAX_WORKERS', 4))
+# Default hard deadline for a single job run, in seconds.
+DEFAULT_DEADLINE_SECONDS = int(os.environ.get('SCRAPE_JOB_DEADLINE_SECONDS', 60))
+
+_pool = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='scrape')
+_running = {} # job name -> Future of the run in progress
+_running_lock = threading.Lock()
+_job_deadline = threading.local()
+
+
+class JobCancelled(Exception):
+    """Raised by check_cancelled() once the running job is past its deadline."""
+
+
+def check_cancelled():
+    """
+    Jobs call this before committing results (e.g. writing a cache) so a run
+    that overran its deadline doesn't overwrite good data with a partial scrape.
+    """
+    at = getattr(_job_deadline, 'at', None)
+    if at is not None and time.monotonic() > at:
+        raise JobCancelled("Job deadline exceeded")
+
+
+def _run_with_deadline(name, func, deadline):
+    _job_deadline.at = deadline
+    http_client.set_deadline(deadline) # Every upstream request in this job honours it
+    started = time.monotonic()
+    succeeded = False
+    try:
+        # Jobs that handle their own errors return False to report a failed run
+        succeeded = profiling.run_profiled(f'job:{name}', func) is not False
+    finally:
+        http_client.set_deadline(None)
+        _job_deadline.at = None
+        with _running_lock:
+            _running.pop(name, None)
+        elapsed = time.monotonic() - started
+        metrics.record_job(name, elapsed, succeeded)
+        logging.info(f"EXECUTOR: Job '{name}' finished in {elapsed:.1f}s.")
+    return succeeded
+
+
+def submit(name: str, func, deadline_seconds: float = DEFAULT_DEADLINE_SECONDS):
+    """
+    Starts `func` on the scrape pool unless a run of job `name` is already in
+    progress, in which case the new run is dropped rather than queued.
+
+    Returns:
+        Future | None: The new run, or None if it was dropped.
+    """
+    with _running_lock:
+        if name in _running:
+            logging.warning(f"EXECUTOR: Job '{name}' is still running, dropping this run.")
+            metrics.JOB_RUNS.inc(name, 'dropped')
+            return None
+        deadline = time.monotonic() + deadline_seconds
+        future = _pool.submit(_run_with_deadline, name, func, deadline)
+        _running[name] = future
+        future.deadline = deadline
+        return future
+
+
+def run_all(jobs: list) -> dict:
+    """
+    Runs [(name, func, deadline_seconds), ...] in parallel and waits until each
+    has finished or hit its deadline, so the total time is about that of the
+    slowest job rather than the sum.
+
+    Returns:
+        dict: job name -> True if it completed in time, False if it failed
+              or overran its deadline. A job that was already running is
+              waited on rather than started again.
+    """
+    futures = {}
+    for name, func, deadline_seconds in jobs:
+        future = submit(name, func, deadline_seconds)
+        if future is None:
+            # Wait on the run already in progress instead of starting another
+            with _running_lock:
+                future = _running.get(name)
+        futures[name] = future
+    pending = [f for f in futures.values() if f is not None]
+    if pending:
+        wait(pending, timeout=max(0.0, max(f.deadline for f in pending) - time.monotonic()))
+
+    results = {}
+    for name, future in futures.items():
+        if future is None:
+            results[name] = False
+        elif not future.done():
+            logging.error(f"EXECUTOR: Job '{name}' overran its deadline; no longer waiting for it.")
+            results[name] = False
+        else:
+            error = future.exception()
+            if error is not None:
+                logging.error(f"EXECUTOR: Job '{name}' failed: {error}")
+            results[name] = error is None and future.result() is not False
+    return results
+
+
+def run(name: str, func, deadline_seconds: float = DEFAULT_DEADLINE_SECONDS) -> bool:
+    """Runs one job through the executor and waits for it (up to its deadline)."""
+    return run_all([(name, func, deadline_seconds)])[name]
@@ -1,9 +1,11 @@
 import requests
-from bs4 import BeautifulSoup
 import json
 import re
 import logging
 
+from http_client import conditional_get
+from html_parsing import make_soup, PRINT_MENU_STRAINER
+
 # --- Configuration ---
 # Configure basic logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -26,6 +28,55 @@ TARGET_STATIONS = [
 UNWANTED_MEAL_TEXT = "vegan and made without gluten pizza available upon request"
 
 # --- Function to Find the Print Menu URL ---
+def fetch_cafe_page(page_url: str) -> str | None:
+    """
+    Fetches the cafe landing page that links to the print and weekly menus.
+
+    Args:
+        page_url (str): The URL of the cafe page.
+
+    Returns:
+        str | None: The page HTML if successful, otherwise None.
+    """
+    logging.info(f"Fetching cafe page: {page_url}")
+    try:
+        # Send an HTTP GET request to the target URL (User-Agent, timeout and
+        # retries come from the shared client in http_client.py)
+        response = conditional_get(page_url)
+        response.raise_for_status() # Check for HTTP errors
+        return response.text
+    except requests.exceptions.Timeout:
+        logging.error(f"Timeout occurred while fetching URL: {page_url}")
+        return None
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Error fetching URL {page_url}: {e}")
+        return None
+    except Exception as e:
+        logging.error(f"An unexpected error occurred while fetching the cafe page: {e}")
+        return None
+
+def find_print_menu_url_in_html(html_content: str, pattern: str) -> str | None:
+    """
+    Searches already-fetched cafe page HTML for a URL matching the given pattern.
+
+    Args:
+        html_content (str): The HTML of the cafe page.
+        pattern (str): The regex pattern to search for the target URL.
+
+    Returns:
+        str | None: The found URL if successful, otherwise None.
+    """
+    # Find the URL using the regular expression
+    match = re.search(pattern, html_content)
+
+    if match:
+        extracted_url = match.group(0)
+        logging.info(f"Successfully found print menu URL: {extracted_url}")
+        return extracted_url
+    else:
+        logging.error(f"Could not find the URL pattern '{pattern}' on the cafe page.")
+        return None
+
 def find_print_menu_url(page_url: str, pattern: str) -> str | None:
     """
     Fetches a web page and searches for a URL matching the given pattern.
@@ -38,41 +89,37 @@ def find_print_menu_url(page_url: str, pattern: str) -> str | None:
         str | None: The found URL if successful, otherwise None.
     """
     logging.info(f"Attempting to find print menu URL on: {page_url}")
-    try:
-        # Send an HTTP GET request to the target URL
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
-        }
-        response = requests.get(page_url, headers=headers, timeout=15) # Increased timeout slightly
-        response.raise_for_status() # Check for HTTP errors
-        html_content = response.text
+    html_content = fetch_cafe_page(page_url)
+    if html_content is None:
+        return None
+    return find_print_menu_url_in_html(html_content, pattern)
 
-        # Find the URL using the regular expression
-        match = re.search(pattern, html_content)
+# --- Function to Scrape the Menu (Unchanged Logic) ---
+def fetch_print_menu(url: str) -> bytes | None:
+    """
+    Downloads the print menu page.
 
-        if match:
-            extracted_url = match.group(0)
-            logging.info(f"Successfully found print menu URL: {extracted_url}")
-            return extracted_url
-        else:
-            logging.error(f"Could not find the URL pattern '{pattern}' on page: {page_url}")
-            return None
+    Args:
+        url (str): The URL of the print menu page.
 
+    Returns:
+        bytes | None: The raw page content, or None on error.
+    """
+    try:
+        response = conditional_get(url)
+        response.raise_for_status()
+        logging.info(f"Successfully fetched menu page: {url}")
+        return response.content
     except requests.exceptions.Timeout:
-        logging.error(f"Timeout occurred while fetching URL: {page_url}")
+        logging.error(f"Timeout occurred while fetching menu URL: {url}")
         return None
     except requests.exceptions.RequestException as e:
-        logging.error(f"Error fetching URL {page_url}: {e}")
-        return None
-    except Exception as e:
-        logging.error(f"An unexpected error occurred while finding the URL: {e}")
+        logging.error(f"Failed to retrieve menu URL {url}: {e}")
         return None
 
-# --- Function to Scrape the Menu (Unchanged Logic) ---
 def _scrape_structured_menu(url: str, target_stations: list) -> dict:
     """
     Internal function to scrape menu data and organize by meal period/station.
-    (Scraping logic remains unchanged as requested)
 
     Args:
         url (str): The URL of the print menu page.
@@ -80,7 +127,27 @@ def _scrape_structured_menu(url: str, target_stations: list) -> dict:
 
     Returns:
         dict: A dictionary representing the structured menu data, or an empty dict on error.
-              Example: {'BREAKFAST': {'Station1': [{'meal': 'MealA', 'description': 'DescA'}, ...], ...}, ...}
+    """
+    content = fetch_print_menu(url)
+    if content is None:
+        return {} # Return empty dict on request errors
+    return parse_structured_menu(content, target_stations)
+
+def parse_structured_menu(content: bytes | str, target_stations: list) -> dict:
+    """
+    Parses print menu HTML and organizes it by meal period/station.
+    (Scraping logic remains unchanged as requested)
+
+    The result is shared by the daily and non-veg views, so every item also
+    carries an 'is_veg' flag taken from its COR icons.
+
+    Args:
+        content (bytes | str): The HTML of the print menu page.
+        target_stations (list): A list of station names (case-insensitive) to scrape.
+
+    Returns:
+        dict: A dictionary representing the structured menu data, or an empty dict on error.
+              Example: {'BREAKFAST': {'Station1': [{'meal': 'MealA', 'description': 'DescA', 'is_veg': False}, ...], ...}, ...}
     """
     normalized_target_stations = set(
         re.sub(r'[^a-z0-9]', '', station.lower()) for station in target_stations
@@ -89,22 +156,14 @@ def _scrape_structured_menu(url: str, target_stations: list) -> dict:
     structured_menu = {}
     current_meal_period = "Unknown Meal Period" # Default in case the first element isn't a daypart
 
-    try:
-        # Use a reasonable timeout for the menu page request
-        response = requests.get(url, timeout=30)
-        response.raise_for_status()
-        logging.info(f"Successfully fetched menu page: {url}")
-    except requests.exceptions.Timeout:
-        logging.error(f"Timeout occurred while fetching menu URL: {url}")
-        return {} # Return empty dict on timeout
-    except requests.exceptions.RequestException as e:
-        logging.error(f"Failed to retrieve menu URL {url}: {e}")
-        return {} # Return empty dict on other request errors
-
-    soup = BeautifulSoup(response.content, 'html.parser')
+    # Only build the #menu-items subtree; re-parse the whole page if it isn't there
+    soup = make_soup(content, PRINT_MENU_STRAINER)
+    menu_content_area = soup.find('div', id='menu-items')
+    if not menu_content_area:
+        soup = make_soup(content)
 
     # Try finding the main content area with common IDs/classes
-    menu_content_area = soup.find('div', id='menu-items') or soup.find('div', class_='main daily')
+    menu_content_area = menu_content_area or soup.find('div', id='menu-items') or soup.find('div', class_='main daily')
 
     if not menu_content_area:
         logging.warning("Could not find the main menu content area (id='menu-items' or class_='main daily').")
@@ -205,6 +264,21 @@ def _scrape_structured_menu(url: str, target_stations: list) -> dict:
                          # Clean up any remaining pipe split remnants (just in case)
                          meal_name = re.split(r'\s*\|', meal_name, 1)[0].strip()
 
+                    # --- Detect Vegetarian/Vegan Status ---
+                    is_veg = False
+                    icons_span = p_tag.find('span', class_='cafeCorIcons')
+                    if icons_span:
+                        # Check for vegetarian or vegan images/classes
+                        # Based on Caf-samp.html: <img class="tipbox vegan" ...> or <img class="tipbox vegetarian" ...>
+                        if icons_span.find('img', class_='vegan') or icons_span.find('img', class_='vegetarian'):
+                            is_veg = True
+                        # Also check title attribute just in case class is missing but title is there
+                        for img in icons_span.find_all('img'):
+                            title = img.get('title', '').lower()
+                            alt = img.get('alt', '').lower()
+                            if 'vegetarian' in title or 'vegan' in title or 'vegetarian' in alt or 'vegan' in alt:
+                                is_veg = True
+
                     # --- Extract Description (if available) ---
                     description = None
                     # Look for specific 'sides' span
@@ -232,7 +306,8 @@ def _scrape_structured_menu(url: str, target_stations: list) -> dict:
                     if meal_name != "Unknown Item" and meal_name != "":
                          structured_menu[current_meal_period][station_name].append({
                              "meal": meal_name,
-                             "description": description # Will be None if no description found
+                             "description": description, # Will be None if no description found
+                             "is_veg": is_veg
                          })
                     else:
                          logging.debug(f"Skipped item with unknown name in station {station_name}")
@@ -272,6 +347,20 @@ def get_menu_data_for_template() -> dict:
         return template_data
 
     # 3. Transform the scraped data for the template
+    return transform_menu_data(scraped)
+
+def transform_menu_data(scraped: dict) -> dict:
+    """
+    Transforms structured menu data into the daily template format.
+
+    Args:
+        scraped (dict): Output of parse_structured_menu. It is not modified.
+
+    Returns:
+        dict: Formatted menu data suitable for templates.
+    """
+    template_data = {'breakfast': [], 'lunch': [], 'dinner': []} # Ensure keys match expected template keys
+
     for meal_period, stations in scraped.items():
         # Map scraped period (e.g., "BREAKFAST") to template key (e.g., "breakfast")
         period_key = meal_period.lower()
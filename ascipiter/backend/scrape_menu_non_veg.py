@@ -1,83 +1,75 @@
-import requests
-from bs4 import BeautifulSoup
 import json
+import os
 import re
 import logging
 from difflib import SequenceMatcher
 
+# The fetch and parse steps are shared with the daily menu scraper; only the
+# vegetarian filtering below is specific to this view.
+from scrape_menu import (
+    BIOLA_CAFE_PAGE_URL,
+    PRINT_MENU_URL_PATTERN,
+    TARGET_STATIONS,
+    UNWANTED_MEAL_TEXT,
+    find_print_menu_url,
+    _scrape_structured_menu,
+)
+
 # --- Configuration ---
 # Configure basic logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# The URL of the page where the print menu link is located
-BIOLA_CAFE_PAGE_URL = "https://cafebiola.cafebonappetit.com/cafe/cafe-biola/"
-
-# The pattern to find the specific print menu URL on the BIOLA_CAFE_PAGE_URL
-PRINT_MENU_URL_PATTERN = r"https://legacy\.cafebonappetit\.com/print-menu/cafe/17/menu/\d+/days/today/pgbrks/0/"
-
-# Stations to target for scraping (case-insensitive matching)
-TARGET_STATIONS = [
-    "Kettle", "Chefs Table", "CHEF'S TABLE",
-    "6th st grill", "6TH ST. GRILL",
-    "home cookin", "HOME COOKIN'",
-    "Pizzeria"
-]
-
-# Specific text to filter out from meal names
-UNWANTED_MEAL_TEXT = "vegan and made without gluten pizza available upon request"
+# Words ignored when deciding whether two meal names share a significant word.
+STOP_WORDS = frozenset({'with', 'and', 'the', 'a', 'an', 'of', 'in', 'on', 'at', 'to', 'for', 'available', 'upon', 'request'})
+# A vegetarian item containing one of these is treated as the substitute for
+# whatever meat option its station has.
+SUBSTITUTE_KEYWORDS = ('beyond', 'plant-based', 'tofu')
+# When set (e.g. 0.6), filter_vegetarian_items only drops a vegetarian item if
+# it is also more similar than this (SequenceMatcher ratio) to one of the
+# non-veg items it shares a word with. Unset keeps the word-match behaviour.
+_threshold = os.environ.get('NON_VEG_SIMILARITY_THRESHOLD')
+SIMILARITY_THRESHOLD = float(_threshold) if _threshold else None
 
 # --- Helper Functions ---
 
-def find_print_menu_url(page_url: str, pattern: str) -> str | None:
-    """
-    Fetches a web page and searches for a URL matching the given pattern.
-    """
-    logging.info(f"Attempting to find print menu URL on: {page_url}")
-    try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
-        }
-        response = requests.get(page_url, headers=headers, timeout=15)
-        response.raise_for_status()
-        html_content = response.text
-
-        match = re.search(pattern, html_content)
-
-        if match:
-            extracted_url = match.group(0)
-            logging.info(f"Successfully found print menu URL: {extracted_url}")
-            return extracted_url
-        else:
-            logging.error(f"Could not find the URL pattern '{pattern}' on page: {page_url}")
-            return None
-
-    except Exception as e:
-        logging.error(f"An unexpected error occurred while finding the URL: {e}")
-        return None
-
 def is_similar(a, b, threshold=0.6):
     """Check if two strings are similar."""
     return SequenceMatcher(None, a.lower(), b.lower()).ratio() > threshold
 
+def significant_words(text):
+    """The lowercase words of `text` that aren't stop words or shorter than 3 letters."""
+    text = re.sub(r'[^\w\s]', '', text.lower())
+    return {w for w in text.split() if w not in STOP_WORDS and len(w) > 2}
+
 def share_significant_word(a, b):
     """Check if two strings share a significant word (ignoring common stop words)."""
-    stop_words = {'with', 'and', 'the', 'a', 'an', 'of', 'in', 'on', 'at', 'to', 'for', 'available', 'upon', 'request'}
-    
-    # Clean and tokenize
-    def tokenize(text):
-        text = re.sub(r'[^\w\s]', '', text.lower())
-        return set([w for w in text.split() if w not in stop_words and len(w) > 2])
+    return not significant_words(a).isdisjoint(significant_words(b))
 
-    tokens_a = tokenize(a)
-    tokens_b = tokenize(b)
-    
-    # Check intersection
-    intersection = tokens_a.intersection(tokens_b)
-    return len(intersection) > 0
+def build_word_index(items):
+    """
+    Builds an inverted index from significant word to the items whose meal
+    name contains it, tokenizing each name once.
 
-def filter_vegetarian_items(station_items):
+    Returns:
+        dict: word -> list of items, in their original order.
+    """
+    index = {}
+    for item in items:
+        for word in significant_words(item['meal']):
+            index.setdefault(word, []).append(item)
+    return index
+
+def filter_vegetarian_items(station_items, similarity_threshold=SIMILARITY_THRESHOLD):
     """
     Filters out vegetarian items if they are likely versions of non-vegetarian items in the same list.
+
+    Non-veg names are indexed by significant word once, so each vegetarian
+    item costs one lookup per word of its own name instead of a comparison
+    against every non-veg item.
+
+    Args:
+        station_items (list): Items of one station, each with 'meal' and 'is_veg'.
+        similarity_threshold (float): Optional scored mode, see SIMILARITY_THRESHOLD.
     """
     non_veg_items = [item for item in station_items if not item.get('is_veg')]
     veg_items = [item for item in station_items if item.get('is_veg')]
@@ -86,151 +78,29 @@ def filter_vegetarian_items(station_items):
     if not non_veg_items:
         return station_items
 
+    word_index = build_word_index(non_veg_items)
     final_items = non_veg_items[:]
-    
+
     for v_item in veg_items:
-        is_version = False
         v_name = v_item['meal']
-        
-        # Check against all non-veg items
-        for nv_item in non_veg_items:
-            nv_name = nv_item['meal']
-            
-            # Criteria 1: Strong keywords indicating a substitute
-            if "beyond" in v_name.lower() or "plant-based" in v_name.lower() or "tofu" in v_name.lower():
-                # If there's a meat option, assume this is the veg alternative
-                is_version = True
-                break
-            
-            # Criteria 2: Shared significant words (e.g. "Mole", "Pizza", "Burger")
-            if share_significant_word(v_name, nv_name):
-                is_version = True
-                break
-                
-        if not is_version:
-            final_items.append(v_item)
-            
-    return final_items
-
-# --- Function to Scrape the Menu ---
-def _scrape_structured_menu(url: str, target_stations: list) -> dict:
-    normalized_target_stations = set(
-        re.sub(r'[^a-z0-9]', '', station.lower()) for station in target_stations
-    )
-
-    structured_menu = {}
-    current_meal_period = "Unknown Meal Period"
+        lower_name = v_name.lower()
 
-    try:
-        response = requests.get(url, timeout=30)
-        response.raise_for_status()
-    except Exception as e:
-        logging.error(f"Failed to retrieve menu URL {url}: {e}")
-        return {}
-
-    soup = BeautifulSoup(response.content, 'html.parser')
-    menu_content_area = soup.find('div', id='menu-items') or soup.find('div', class_='main daily') or soup.find('body')
-
-    if not menu_content_area:
-        return {}
-
-    potential_elements = menu_content_area.select('.daypart, .row.even, .row.odd')
-    if not potential_elements:
-        potential_elements = menu_content_area.find_all(['div', 'h2'], recursive=False)
-
-    for element in potential_elements:
-        # --- Check for Meal Period Header ---
-        is_daypart = 'daypart' in element.get('class', [])
-        day_spacer = element.find('div', class_='spacer day') if is_daypart else None
-        is_meal_header_tag = element.name == 'h2' and element.get_text(strip=True).upper() in ['BREAKFAST', 'LUNCH', 'DINNER', 'BRUNCH']
+        # Criteria 1: Strong keywords indicating a substitute
+        if any(keyword in lower_name for keyword in SUBSTITUTE_KEYWORDS):
+            # If there's a meat option, assume this is the veg alternative
+            continue
 
-        if day_spacer:
-            current_meal_period = day_spacer.get_text(strip=True).upper()
+        # Criteria 2: Shared significant words (e.g. "Mole", "Pizza", "Burger")
+        shared = [word for word in significant_words(v_name) if word in word_index]
+        if shared and similarity_threshold is None:
             continue
-        elif is_meal_header_tag:
-            current_meal_period = element.get_text(strip=True).upper()
+        if shared and any(is_similar(v_name, nv_item['meal'], similarity_threshold)
+                          for word in shared for nv_item in word_index[word]):
             continue
 
-        # --- Check for Menu Item Row ---
-        is_row = 'row' in element.get('class', [])
-        station_span = element.find('span', class_='stationname') if is_row else element.find('div', class_='stationname')
-
-        if station_span:
-            station_name = station_span.get_text(strip=True)
-            normalized_station = re.sub(r'[^a-z0-9]', '', station_name.lower())
-
-            if normalized_station in normalized_target_stations:
-                if current_meal_period not in structured_menu:
-                    structured_menu[current_meal_period] = {}
-                if station_name not in structured_menu[current_meal_period]:
-                    structured_menu[current_meal_period][station_name] = []
-
-                description_div = element.find('div', class_='description')
-                if not description_div:
-                    continue
-
-                items = description_div.find_all(['div', 'p'], class_='item')
-                if not items:
-                    items = description_div.find_all('p', recursive=False)
-
-                for item in items:
-                    p_tag = item if item.name == 'p' else item.find('p')
-                    if not p_tag:
-                        if item.get_text(strip=True):
-                            p_tag = item
-                        else:
-                            continue
-
-                    meal_name = "Unknown Item"
-                    strong_tag = p_tag.find('strong')
-                    text_content = p_tag.get_text(separator=' ', strip=True)
-
-                    if strong_tag:
-                        meal_name = strong_tag.get_text(strip=True)
-                        meal_name = re.split(r'\s*\|', meal_name, 1)[0].strip()
-                    elif text_content:
-                        meal_name = re.split(r'\s*(?:<span class="cafeCorIcons">|<div class="price">|\|)', text_content, 1)[0].strip()
-                        meal_name = re.split(r'\s*\|', meal_name, 1)[0].strip()
-
-                    # --- Detect Vegetarian/Vegan Status ---
-                    is_veg = False
-                    icons_span = p_tag.find('span', class_='cafeCorIcons')
-                    if icons_span:
-                        # Check for vegetarian or vegan images/classes
-                        # Based on Caf-samp.html: <img class="tipbox vegan" ...> or <img class="tipbox vegetarian" ...>
-                        if icons_span.find('img', class_='vegan') or icons_span.find('img', class_='vegetarian'):
-                            is_veg = True
-                        # Also check title attribute just in case class is missing but title is there
-                        for img in icons_span.find_all('img'):
-                            title = img.get('title', '').lower()
-                            alt = img.get('alt', '').lower()
-                            if 'vegetarian' in title or 'vegan' in title or 'vegetarian' in alt or 'vegan' in alt:
-                                is_veg = True
-
-                    # --- Extract Description ---
-                    description = None
-                    sides_span = p_tag.find('span', class_='sides collapsed') or p_tag.find('span', class_='sides')
-                    if sides_span:
-                        desc_text = sides_span.get_text(strip=True)
-                        desc_text = re.sub(r'^(with|side:)\s+', '', desc_text, flags=re.IGNORECASE)
-                        description = desc_text if desc_text else None
-                    elif meal_name != "Unknown Item" and meal_name != "":
-                        potential_desc = text_content.replace(meal_name, '', 1).strip()
-                        potential_desc = re.split(r'\s*(?:<span class="cafeCorIcons">|<div class="price">)', potential_desc, 1)[0].strip()
-                        potential_desc = re.sub(r'^\s*[\|-]\s*', '', potential_desc).strip()
-                        potential_desc = re.sub(r'^(with|side:)\s+', '', potential_desc, flags=re.IGNORECASE)
-                        if potential_desc and len(potential_desc) > 2 and potential_desc.lower() != meal_name.lower():
-                            description = potential_desc
-
-                    if meal_name != "Unknown Item" and meal_name != "":
-                        structured_menu[current_meal_period][station_name].append({
-                            "meal": meal_name,
-                            "description": description,
-                            "is_veg": is_veg
-                        })
-
-    return structured_menu
+        final_items.append(v_item)
 
+    return final_items
 
 # --- Main Function to Get and Format Data ---
 def get_non_veg_menu_data() -> dict:
@@ -251,6 +121,15 @@ def get_non_veg_menu_data() -> dict:
     if not scraped:
         return template_data
 
+    return transform_non_veg_menu_data(scraped)
+
+def transform_non_veg_menu_data(scraped: dict) -> dict:
+    """
+    Transforms structured menu data into the template format, filtering out
+    vegetarian versions of meals. The input is not modified.
+    """
+    template_data = {'breakfast': [], 'lunch': [], 'dinner': []}
+
     for meal_period, stations in scraped.items():
         period_key = meal_period.lower()
         if period_key not in template_data:
@@ -0,0 +1,149 @@
+# scrape_pipeline.py
+
+import datetime
+import logging
+import threading
+import time
+
+from scrape_menu import (
+    BIOLA_CAFE_PAGE_URL,
+    PRINT_MENU_URL_PATTERN,
+    TARGET_STATIONS,
+    fetch_cafe_page,
+    fetch_print_menu,
+    find_print_menu_url_in_html,
+    parse_structured_menu,
+    transform_menu_data,
+)
+from scrape_menu_non_veg import transform_non_veg_menu_data
+from scrape_weekly import fetch_weekly_menu, find_weekly_menu_url_in_html, parse_week_start, parse_weekly_menu
+from http_client import content_hash
+
+# --- Configuration ---
+# How long a fetched cafe page may be reused by the other jobs of the same
+# cycle (the daily job and the weekly job usually run back to back).
+CAFE_PAGE_MAX_AGE_SECONDS = 300
+
+_cafe_page_lock = threading.Lock()
+_cafe_page = {'html': None, 'fetched_at': 0.0}
+
+# The last successful parse of each upstream page, with the hash of the body it
+# came from. Results are shared between calls, so callers must not modify them.
+_parsed = {}
+_parsed_lock = threading.Lock()
+
+
+def _empty_menu():
+    return {'breakfast': [], 'lunch': [], 'dinner': []}
+
+
+def get_cafe_page(max_age: float = CAFE_PAGE_MAX_AGE_SECONDS) -> str | None:
+    """
+    Returns the cafe page HTML, fetching it only if the last copy is older
+    than max_age seconds. Concurrent callers wait for a single fetch.
+    """
+    with _cafe_page_lock:
+        if _cafe_page['html'] is not None and time.monotonic() - _cafe_page['fetched_at'] < max_age:
+            logging.info("Reusing cafe page fetched earlier in this cycle.")
+            return _cafe_page['html']
+
+        html = fetch_cafe_page(BIOLA_CAFE_PAGE_URL)
+        if html is not None:
+            _cafe_page['html'] = html
+            _cafe_page['fetched_at'] = time.monotonic()
+        return html
+
+
+def _parse_once(name: str, content: bytes | str, parse):
+    """
+    Returns parse(content), reusing the previous result for `name` when the
+    body hashes the same (which includes every upstream 304). Empty results
+    are returned but not remembered.
+    """
+    digest = content_hash(content)
+    with _parsed_lock:
+        cached = _parsed.get(name)
+    if cached is not None and cached[0] == digest:
+        logging.info(f"{name} is unchanged since the last parse, skipping parse.")
+        return cached[1]
+
+    result = parse(content)
+    if result:
+        with _parsed_lock:
+            _parsed[name] = (digest, result)
+    return result
+
+
+def _build_daily_views(content: bytes) -> tuple[dict, dict] | None:
+    scraped = parse_structured_menu(content, TARGET_STATIONS)
+    if not scraped:
+        return None
+    return transform_menu_data(scraped), transform_non_veg_menu_data(scraped)
+
+
+def _build_weekly(content: bytes) -> tuple[dict, datetime.date | None] | None:
+    weekly_menu = parse_weekly_menu(content)
+    if not weekly_menu:
+        return None
+    return weekly_menu, parse_week_start(content)
+
+
+def scrape_daily_menus(max_age: float = CAFE_PAGE_MAX_AGE_SECONDS) -> tuple[dict, dict] | None:
+    """
+    Fetches and parses today's print menu once and builds both views from it.
+
+    Returns:
+        tuple[dict, dict] | None: (daily menu, non-veg menu) in the template
+                                  format, or None if a fetch failed (callers
+                                  keep the data they have). A print menu that
+                                  lists nothing gives two empty structures.
+    """
+    html = get_cafe_page(max_age)
+    if html is None:
+        logging.error("Could not fetch the cafe page. Cannot proceed with scraping.")
+        return None
+
+    print_menu_url = find_print_menu_url_in_html(html, PRINT_MENU_URL_PATTERN)
+    if not print_menu_url:
+        logging.error("Could not find the print menu URL. Cannot proceed with scraping.")
+        return None
+
+    content = fetch_print_menu(print_menu_url)
+    if content is None:
+        return None
+
+    views = _parse_once('print_menu', content, _build_daily_views)
+    if not views:
+        logging.warning("No data scraped from the menu page, returning empty structure.")
+        return _empty_menu(), _empty_menu()
+    return views
+
+
+def find_weekly_menu_url(max_age: float = CAFE_PAGE_MAX_AGE_SECONDS) -> str | None:
+    """Finds the weekly menu URL on the (possibly reused) cafe page."""
+    html = get_cafe_page(max_age)
+    if html is None:
+        return None
+    return _parse_once('weekly_menu_link', html, find_weekly_menu_url_in_html)
+
+
+def scrape_weekly(max_age: float = CAFE_PAGE_MAX_AGE_SECONDS) -> tuple[dict, datetime.date | None] | None:
+    """
+    Finds and scrapes the weekly menu, skipping the parse when the page is
+    unchanged since the last run.
+
+    Returns:
+        tuple[dict, datetime.date | None] | None: (weekly menu, first date of
+                                                  the week it covers, or None
+                                                  if the page doesn't say), or
+                                                  None if any step fails.
+    """
+    weekly_url = find_weekly_menu_url(max_age)
+    if not weekly_url:
+        logging.error("Failed to find the weekly menu URL.")
+        return None
+
+    content = fetch_weekly_menu(weekly_url)
+    if content is None:
+        return None
+    return _parse_once('weekly_menu', content, _build_weekly)
@@ -1,29 +1,43 @@
 # scrape_weather.py
+import re
 import requests
-from bs4 import BeautifulSoup
 import logging
 
+import http_client
+from html_parsing import make_soup
+
 # Configure basic logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# e.g. "72.4 °F", "-3 C"
+TEMPERATURE_PATTERN = re.compile(r'(-?\d+(?:\.\d+)?)\s*(?:°|º|deg)?\s*([FC])\b', re.IGNORECASE)
+
+def parse_temperature(text):
+    """
+    Parses a temperature cell such as "72.4 °F".
+
+    Returns:
+        tuple or None: (value as float, unit 'F' or 'C'), or None if `text` has no temperature.
+    """
+    match = TEMPERATURE_PATTERN.search(text or '')
+    if not match:
+        return None
+    return float(match.group(1)), match.group(2).upper()
+
 def get_weather():
     """
     Scrapes the Biola weather page by finding the "Temperature" label in the table
     and extracting the value from the adjacent cell.
     """
     url = 'https://www.biola.edu/academics/physics/weather/'
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.114 Safari/537.36'
-    }
-    
     data = {
         'temperature': [],
     }
 
     try:
-        response = requests.get(url, headers=headers, timeout=10)
+        response = http_client.get(url)
         response.raise_for_status() 
-        soup = BeautifulSoup(response.text, 'html.parser') # Use 'html.parser'
+        soup = make_soup(response.text) # Backend is configured in html_parsing.py
 
         # --- THIS IS THE NEW LOGIC ---
         # 1. Find the <strong> tag that contains the exact text "Temperature"
@@ -1,7 +1,12 @@
+import datetime
+import re
+
 import requests
-from bs4 import BeautifulSoup
 import json
 
+from http_client import conditional_get
+from html_parsing import make_soup, LINKS_STRAINER, WEEKLY_MENU_STRAINER
+
 def find_weekly_menu_url(page_url):
     """
     Scrapes the main cafe page to find the dynamic weekly menu URL.
@@ -14,42 +19,54 @@ def find_weekly_menu_url(page_url):
     """
     print(f"Searching for weekly menu link on: {page_url}...")
     try:
-        # Set a user-agent to mimic a browser
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.114 Safari/537.36'
-        }
-        response = requests.get(page_url, headers=headers, timeout=10)
+        response = conditional_get(page_url)
         response.raise_for_status() # Raise an error for bad status codes
-        
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        # Find the <a> tag that contains the text "View/Print Weekly Menu"
-        menu_link = soup.find('a', string='View/Print Weekly Menu')
-        
-        if menu_link and 'href' in menu_link.attrs:
-            url = menu_link['href']
-            print(f"Successfully found weekly menu URL: {url}")
-            return url
-        else:
-            print("Error: Could not find the 'View/Print Weekly Menu' link on the page.")
-            return None
-            
     except requests.exceptions.RequestException as e:
         print(f"Error: Could not fetch the main cafe page.")
         print(f"Details: {e}")
         return None
 
+    return find_weekly_menu_url_in_html(response.content)
+
+def find_weekly_menu_url_in_html(html_content):
+    """
+    Finds the weekly menu URL in already-fetched cafe page HTML.
+
+    Args:
+        html_content (str or bytes): The HTML of the main cafe page.
+
+    Returns:
+        str or None: The found weekly menu URL, or None if it could not be found.
+    """
+    soup = make_soup(html_content, LINKS_STRAINER)
+
+    # Find the <a> tag that contains the text "View/Print Weekly Menu"
+    menu_link = soup.find('a', string='View/Print Weekly Menu')
+
+    if menu_link and 'href' in menu_link.attrs:
+        url = menu_link['href']
+        print(f"Successfully found weekly menu URL: {url}")
+        return url
+    else:
+        print("Error: Could not find the 'View/Print Weekly Menu' link on the page.")
+        return None
+
 def scrape_weekly_menu(url):
     """
     Scrapes the weekly menu from the given URL and returns a sorted dictionary of meals.
     """
+    html_content = fetch_weekly_menu(url)
+    if html_content is None:
+        return None
+    return parse_weekly_menu(html_content)
+
+def fetch_weekly_menu(url):
+    """
+    Downloads the weekly menu page, returning its raw content or None on error.
+    """
     print(f"\nFetching menu from: {url}...")
     try:
-        # Set a user-agent to mimic a browser, which can help prevent getting blocked
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.114 Safari/537.36'
-        }
-        response = requests.get(url, headers=headers, timeout=10)
+        response = conditional_get(url)
         # This will raise an error if the request was unsuccessful (e.g., 404 Not Found)
         response.raise_for_status()
         print("Successfully fetched the webpage.")
@@ -58,7 +75,38 @@ def scrape_weekly_menu(url):
         print(f"Details: {e}")
         return None
 
-    soup = BeautifulSoup(response.content, 'html.parser')
+    return response.content
+
+# The page header names the week it covers, e.g. "Week of September 22, 2025".
+WEEK_OF_PATTERN = re.compile(r'Week of\s+([A-Za-z]+)\.?\s+(\d{1,2}),?\s+(\d{4})', re.IGNORECASE)
+
+def parse_week_start(html_content):
+    """
+    Reads the first date of the week from the weekly menu page header.
+
+    Returns:
+        datetime.date or None: The date, or None if the header doesn't give one.
+    """
+    if isinstance(html_content, bytes):
+        html_content = html_content.decode('utf-8', errors='replace')
+    match = WEEK_OF_PATTERN.search(html_content)
+    if not match:
+        return None
+    month, day, year = match.groups()
+    # Full month names, then abbreviations ("Sep", and "Sept" cut to it)
+    for month_name, month_format in ((month, '%B'), (month[:3], '%b')):
+        try:
+            return datetime.datetime.strptime(f"{month_name} {day} {year}", f"{month_format} %d %Y").date()
+        except ValueError:
+            continue
+    return None
+
+def parse_weekly_menu(html_content):
+    """
+    Parses already-fetched weekly menu HTML into a sorted dictionary of meals.
+    """
+    # Only the day header and station rows are read, so only those are parsed
+    soup = make_soup(html_content, WEEKLY_MENU_STRAINER)
 
     # --- Data structure and mapping setup ---
     days_order = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
@@ -1,20 +1,35 @@
 # server.py
 
-from flask import Flask, jsonify, request
+from flask import Flask, g, jsonify, request
 from flask_cors import CORS
 import sqlite3
 import datetime
+import atexit
+import bisect
+import collections
 import logging
-import json
 import os
+import threading
+import time
 from apscheduler.schedulers.background import BackgroundScheduler
 
 # Import the functions from your scraper files
-from scrape_menu import get_menu_data_for_template
-from scrape_menu_non_veg import get_non_veg_menu_data
-from scrape_weather import get_weather
-from scrape_chapel import get_chapel_events
-from scrape_weekly import find_weekly_menu_url, scrape_weekly_menu
+import compression
+import events
+import leader
+import metrics
+import profiling
+import scrape_executor
+import menu_archive
+import menu_versions
+from cache_store import CacheStore
+from db import ConnectionPool, RATINGS_MIGRATIONS, ANALYTICS_MIGRATIONS, ARCHIVE_MIGRATIONS, METRICS_MIGRATIONS
+from rating_store import RatingStore
+from leaderboard import MAX_TOP_LIMIT, meal_id, station_of, station_slug
+from http_client import content_hash
+from scrape_pipeline import scrape_daily_menus, scrape_weekly
+from scrape_weather import get_weather, parse_temperature
+from scrape_chapel import CHAPEL_TIMEZONE, get_chapel_events
 
 # Configure basic logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -27,176 +42,547 @@ CORS(app, resources={r"/api/*": {"origins": ["http://localhost:5173", "https://b
 
 
 # --- FILE PATH CONFIGURATION ---
-MENU_CACHE_FILE = 'menu_cache.json'
-MENU_CACHE_NON_VEG_FILE = 'menu_cache_non_veg.json'
-CHAPEL_CACHE_FILE = 'chapel_cache.json'
-WEEKLY_MENU_CACHE_FILE = 'weekly_menu_cache.json'
-ANNOUNCEMENT_FILE = 'announcement.json' # --- NEW ---
+CACHE_DB = 'cache.db'
 RATINGS_DB = 'ratings.db'
+ANALYTICS_DB = 'analytics.db'
+ARCHIVE_DB = 'menu_archive.db'
+METRICS_DB = 'metrics.db'
 
 # --- SECURITY CONFIGURATION ---
 ADMIN_SECRET = 'EGG' # --- NEW: CHANGE THIS TO MATCH N8N ---
 
+# --- WEATHER CONFIGURATION ---
+# /api/weather serves the cached reading and, once it is older than this,
+# starts one background refresh.
+WEATHER_TTL_SECONDS = int(os.environ.get('WEATHER_TTL_SECONDS', 300))
+# Minimum time between refresh attempts, so a failing upstream isn't retried on every request.
+WEATHER_RETRY_SECONDS = int(os.environ.get('WEATHER_RETRY_SECONDS', 60))
 
-# --- CACHE & DB FUNCTIONS ---
-def read_menu_cache():
-    if os.path.exists(MENU_CACHE_FILE):
-        try:
-            with open(MENU_CACHE_FILE, 'r') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, IOError) as e:
-            logging.error(f"Error reading menu cache file {MENU_CACHE_FILE}: {e}")
-    return None
+# --- REFRESH CONFIGURATION ---
+# A client refresh only scrapes upstream when the cached menu is older than this.
+# The scrape runs as the 'daily_menus' job, so concurrent refreshes and a
+# scheduled run in progress share one scrape and its deadline.
+MENU_REFRESH_MIN_AGE_SECONDS = int(os.environ.get('MENU_REFRESH_MIN_AGE_SECONDS', 300))
 
-def write_menu_cache(data):
-    cache_content = {
-        'timestamp': datetime.datetime.utcnow().isoformat(),
-        'data': data
-    }
+
+# --- CACHE STORE ---
+# Scraped data and the announcement live in cache.db under these keys; see cache_store.py.
+MENU_CACHE = 'menu'
+MENU_CACHE_NON_VEG = 'menu_non_veg'
+CHAPEL_CACHE = 'chapel'
+WEEKLY_MENU_CACHE = 'weekly_menu'
+ANNOUNCEMENT_CACHE = 'announcement'
+WEATHER_CACHE = 'weather'
+PROFILING_CACHE = 'profiling' # Settings set through /api/admin/profiling
+
+# The JSON files the caches used to live in, imported once by create_app().
+# key -> (path, whether the file wraps the value in {'timestamp', 'data'})
+LEGACY_CACHE_FILES = {
+    MENU_CACHE: ('menu_cache.json', True),
+    MENU_CACHE_NON_VEG: ('menu_cache_non_veg.json', True),
+    CHAPEL_CACHE: ('chapel_cache.json', True),
+    WEEKLY_MENU_CACHE: ('weekly_menu_cache.json', True),
+    ANNOUNCEMENT_CACHE: ('announcement.json', False),
+}
+
+DEFAULT_ANNOUNCEMENT = {"message": "", "id": None}
+
+cache_store = CacheStore(CACHE_DB)
+
+# Changes to these keys are pushed to /api/events streams; see events.py.
+EVENT_KEYS = (MENU_CACHE, MENU_CACHE_NON_VEG, WEEKLY_MENU_CACHE, CHAPEL_CACHE, ANNOUNCEMENT_CACHE)
+event_broker = events.EventBroker(cache_store, EVENT_KEYS)
+
+def read_cache(key):
+    """Returns {'data', 'timestamp', 'version'} for `key`, or None if it's empty or unreadable."""
     try:
-        with open(MENU_CACHE_FILE, 'w') as f:
-            json.dump(cache_content, f)
-        logging.info("Successfully wrote to menu cache.")
-    except IOError as e:
-        logging.error(f"Error writing to menu cache file {MENU_CACHE_FILE}: {e}")
-
-def read_menu_cache_non_veg():
-    if os.path.exists(MENU_CACHE_NON_VEG_FILE):
-        try:
-            with open(MENU_CACHE_NON_VEG_FILE, 'r') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, IOError) as e:
-            logging.error(f"Error reading non-veg menu cache file {MENU_CACHE_NON_VEG_FILE}: {e}")
-    return None
+        return cache_store.get(key)
+    except (sqlite3.Error, ValueError) as e:
+        logging.error(f"Error reading '{key}' from the cache store: {e}")
+        return None
 
-def write_menu_cache_non_veg(data):
-    cache_content = {
-        'timestamp': datetime.datetime.utcnow().isoformat(),
-        'data': data
-    }
+def read_cache_meta(key):
+    """Returns {'timestamp', 'version', 'hash'} for `key`, or None if it's empty or unreadable."""
     try:
-        with open(MENU_CACHE_NON_VEG_FILE, 'w') as f:
-            json.dump(cache_content, f)
-        logging.info("Successfully wrote to non-veg menu cache.")
-    except IOError as e:
-        logging.error(f"Error writing to non-veg menu cache file {MENU_CACHE_NON_VEG_FILE}: {e}")
-
-def read_chapel_cache():
-    if os.path.exists(CHAPEL_CACHE_FILE):
-        try:
-            with open(CHAPEL_CACHE_FILE, 'r') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, IOError) as e:
-            logging.error(f"Error reading chapel cache file {CHAPEL_CACHE_FILE}: {e}")
-    return None
+        return cache_store.meta(key)
+    except sqlite3.Error as e:
+        logging.error(f"Error reading '{key}' from the cache store: {e}")
+        return None
 
-def write_chapel_cache(data):
-    cache_content = {
-        'timestamp': datetime.datetime.utcnow().isoformat(),
-        'data': data
-    }
+def write_cache(key, data):
     try:
-        with open(CHAPEL_CACHE_FILE, 'w') as f:
-            json.dump(cache_content, f)
-        logging.info("Successfully wrote to chapel cache.")
-    except IOError as e:
-        logging.error(f"Error writing to chapel cache file {CHAPEL_CACHE_FILE}: {e}")
-
-def read_weekly_menu_cache():
-    if os.path.exists(WEEKLY_MENU_CACHE_FILE):
+        version, changed = cache_store.put(key, data)
+    except sqlite3.Error as e:
+        logging.error(f"Error writing '{key}' to the cache store: {e}")
+        return
+    if not changed:
+        logging.info(f"'{key}' is unchanged (version {version}); refreshed its timestamp.")
+        return
+    logging.info(f"Successfully wrote '{key}' to the cache store (version {version}).")
+    invalidate_response_cache(key, version)
+    event_broker.notify()
+
+
+# --- RESPONSE CACHE ---
+# Ready-to-send JSON bodies for the read endpoints, keyed by cache key. An entry
+# is dropped when write_cache() runs, and re-validated against the key's
+# version in cache.db at most every RESPONSE_CACHE_CHECK_INTERVAL seconds so
+# that writes made by other processes are picked up too. Each entry also holds
+# gzip/brotli copies of its body, built with it (see compression.py), and a
+# content hash sent as its ETag.
+RESPONSE_CACHE_CHECK_INTERVAL = 2.0
+
+_response_cache = {}
+_response_cache_written = {} # key -> newest version written by this process
+_response_cache_lock = threading.Lock()
+
+# Recent menu versions by hash, for /api/menu/refresh?since=; see menu_versions.py.
+VERSIONED_MENUS = (MENU_CACHE, MENU_CACHE_NON_VEG)
+menu_history = menu_versions.VersionHistory()
+
+def invalidate_response_cache(key, version):
+    with _response_cache_lock:
+        _response_cache.pop(key, None)
+        _response_cache_written[key] = max(version, _response_cache_written.get(key, 0))
+
+def _send_cached(key, entry):
+    if request.if_none_match.contains_weak(entry['hash']):
+        response = app.response_class(status=304)
+        encoding = body = None
+    else:
+        encoding = compression.negotiate(request.accept_encodings, entry['variants'])
+        body = entry['variants'][encoding] if encoding else entry['body']
+        response = app.response_class(body, mimetype=app.json.mimetype)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        metrics.RESPONSE_BYTES.inc(key, encoding or 'identity', amount=len(body))
+    # Weak: the gzip/brotli/identity bodies are the same JSON
+    response.set_etag(entry['hash'], weak=True)
+    if entry['variants']:
+        response.vary.add('Accept-Encoding')
+    return response
+
+def cached_entry(key, extract):
+    """
+    Returns the response cache entry for the cache entry `key`, serialized
+    and compressed at most once per version: {'body', 'payload', 'hash',
+    'variants', 'version', 'checked_at'}. `extract` picks the payload to send from
+    read_cache()'s result; if it returns None nothing is cached and None is
+    returned.
+    """
+    now = time.monotonic()
+    entry = _response_cache.get(key)
+    if entry and now - entry['checked_at'] < RESPONSE_CACHE_CHECK_INTERVAL:
+        metrics.CACHE_LOOKUPS.inc(key, 'hit')
+        return entry
+
+    if entry:
         try:
-            with open(WEEKLY_MENU_CACHE_FILE, 'r') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, IOError) as e:
-            logging.error(f"Error reading weekly menu cache file {WEEKLY_MENU_CACHE_FILE}: {e}")
+            current_version = cache_store.version(key)
+        except sqlite3.Error as e:
+            logging.error(f"Error checking the version of '{key}': {e}")
+            current_version = None
+        if current_version == entry['version']:
+            entry['checked_at'] = now
+            metrics.CACHE_LOOKUPS.inc(key, 'hit')
+            return entry
+
+    metrics.CACHE_LOOKUPS.inc(key, 'miss')
+    cached_info = read_cache(key)
+    payload = extract(cached_info)
+    if payload is None:
+        return None
+
+    body = app.json.response(payload).get_data() # Same bytes jsonify would send
+    version = cached_info['version'] if cached_info else 0
+    # The stored value's hash: readers can compare it without loading the value (see cache_store.meta())
+    body_hash = cached_info['hash'] if cached_info else content_hash(body)[:16]
+    entry = {'body': body, 'payload': payload, 'hash': body_hash,
+             'variants': compression.precompress(body), 'version': version, 'checked_at': now}
+    if key in VERSIONED_MENUS:
+        menu_history.record(key, entry['hash'], payload)
+    with _response_cache_lock:
+        # Skip storing if this process wrote a newer version while we were reading.
+        if version >= _response_cache_written.get(key, 0):
+            _response_cache[key] = entry
+    return entry
+
+def cached_json_response(key, extract):
+    """A JSON response for the cache entry `key` (see cached_entry()), or None if `extract` returns None."""
+    entry = cached_entry(key, extract)
+    return _send_cached(key, entry) if entry else None
+
+def _cache_data(cached_info):
+    if cached_info and 'data' in cached_info:
+        return cached_info['data']
     return None
 
-def write_weekly_menu_cache(data):
-    cache_content = {
-        'timestamp': datetime.datetime.utcnow().isoformat(),
-        'data': data
-    }
-    try:
-        with open(WEEKLY_MENU_CACHE_FILE, 'w') as f:
-            json.dump(cache_content, f)
-        logging.info("Successfully wrote to weekly menu cache.")
-    except IOError as e:
-        logging.error(f"Error writing to weekly menu cache file {WEEKLY_MENU_CACHE_FILE}: {e}")
-
-# --- NEW: Announcement Cache Functions ---
-def read_announcement_cache():
-    if os.path.exists(ANNOUNCEMENT_FILE):
-        try:
-            with open(ANNOUNCEMENT_FILE, 'r') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, IOError) as e:
-            logging.error(f"Error reading announcement file: {e}")
-    # Return default structure if file doesn't exist or errors
-    return {"message": "", "id": None}
-
-def write_announcement_cache(data):
+def _chapel_data(cached_info):
+    return cached_info.get('data', []) if cached_info else []
+
+def _announcement_data(cached_info):
+    return cached_info['data'] if cached_info else DEFAULT_ANNOUNCEMENT
+
+
+# The databases are opened once and shared through small connection pools
+# (WAL mode, tuned pragmas, cached statements); see db.py.
+ratings_db = ConnectionPool(RATINGS_DB, RATINGS_MIGRATIONS)
+# Rating reads are served from this copy of ratings.db; see load_ratings().
+rating_store = RatingStore()
+analytics_db = ConnectionPool(ANALYTICS_DB, ANALYTICS_MIGRATIONS)
+# Every scraped menu is also appended here for /api/search; see menu_archive.py.
+archive_db = ConnectionPool(ARCHIVE_DB, ARCHIVE_MIGRATIONS)
+# Metrics and profiles of every worker process; see metrics.py and profiling.py.
+metrics_db = ConnectionPool(METRICS_DB, METRICS_MIGRATIONS)
+profiling.use_database(metrics_db)
+
+
+def cache_age_seconds(cached_info):
+    """Seconds since a cache entry was written, or None if it has no valid timestamp."""
     try:
-        with open(ANNOUNCEMENT_FILE, 'w') as f:
-            json.dump(data, f)
-        logging.info("Successfully wrote to announcement cache.")
-    except IOError as e:
-        logging.error(f"Error writing to announcement file: {e}")
+        written = datetime.datetime.fromisoformat(cached_info['timestamp'])
+    except (TypeError, KeyError, ValueError):
+        return None
+    return (datetime.datetime.utcnow() - written).total_seconds()
 
 
-def get_ratings_db_connection():
-    """Establishes a connection to the ratings database."""
-    conn = sqlite3.connect(RATINGS_DB)
-    conn.row_factory = sqlite3.Row
-    return conn
+def archive_menus(daily_menu=None, weekly_menu=None, week_start=None):
+    """Appends freshly scraped menus to the archive. Failures are logged, never raised."""
+    try:
+        with archive_db.connection() as conn, metrics.DB_QUERY_LATENCY.time('archive_menus'):
+            added = 0
+            if daily_menu:
+                added += menu_archive.archive_daily_menu(conn, daily_menu)
+            if weekly_menu:
+                added += menu_archive.archive_weekly_menu(conn, weekly_menu, week_start)
+        if added:
+            logging.info(f"Archived {added} new meals.")
+    except sqlite3.Error as e:
+        logging.error(f"Database error archiving menus: {e}")
 
 
 # --- BACKGROUND JOB FUNCTIONS ---
-def update_menu_cache_job():
+def update_daily_menu_caches_job():
+    # The daily and non-veg caches are both built from one fetch/parse of the
+    # print menu, so they always come from the same upstream snapshot.
     with app.app_context():
-        logging.info("SCHEDULER: Running scheduled daily menu scrape job...")
+        logging.info("SCHEDULER: Running scheduled daily + NON-VEG menu scrape job...")
         try:
-            menu_data = get_menu_data_for_template()
-            write_menu_cache(menu_data)
-            logging.info("SCHEDULER: Daily menu cache successfully updated.")
+            menus = scrape_daily_menus()
+            if menus is None:
+                logging.error("SCHEDULER: Failed to scrape the daily menus; keeping the cached ones.")
+                return False
+            scrape_executor.check_cancelled()
+            menu_data, non_veg_menu_data = menus
+            write_cache(MENU_CACHE, menu_data)
+            write_cache(MENU_CACHE_NON_VEG, non_veg_menu_data)
+            archive_menus(daily_menu=menu_data)
+            logging.info("SCHEDULER: Daily and NON-VEG menu caches successfully updated.")
+            return True
         except Exception as e:
             logging.error(f"SCHEDULER: Error during scheduled daily scrape: {e}")
-
-def update_non_veg_menu_cache_job():
-    with app.app_context():
-        logging.info("SCHEDULER: Running scheduled daily NON-VEG menu scrape job...")
-        try:
-            menu_data = get_non_veg_menu_data()
-            write_menu_cache_non_veg(menu_data)
-            logging.info("SCHEDULER: Daily NON-VEG menu cache successfully updated.")
-        except Exception as e:
-            logging.error(f"SCHEDULER: Error during scheduled daily NON-VEG scrape: {e}")
+            return False
 
 def update_weekly_menu_cache_job():
     with app.app_context():
         logging.info("SCHEDULER: Running scheduled WEEKLY menu scrape job...")
         try:
-            cafe_page_url = "https://cafebiola.cafebonappetit.com/cafe/cafe-biola/"
-            weekly_url = find_weekly_menu_url(cafe_page_url)
-            if weekly_url:
-                menu_data = scrape_weekly_menu(weekly_url)
-                if menu_data:
-                    write_weekly_menu_cache(menu_data)
-                    logging.info("SCHEDULER: Weekly menu cache successfully updated.")
+            scraped = scrape_weekly()
+            scrape_executor.check_cancelled()
+            if scraped:
+                menu_data, week_start = scraped
+                write_cache(WEEKLY_MENU_CACHE, menu_data)
+                if week_start:
+                    archive_menus(weekly_menu=menu_data, week_start=week_start)
                 else:
-                    logging.error("SCHEDULER: Failed to scrape weekly menu data from the found URL.")
-            else:
-                logging.error("SCHEDULER: Failed to find the weekly menu URL.")
+                    logging.warning("SCHEDULER: The weekly menu doesn't say which week it covers; not archiving it.")
+                logging.info("SCHEDULER: Weekly menu cache successfully updated.")
+                return True
+            logging.error("SCHEDULER: Failed to scrape weekly menu data.")
+            return False
         except Exception as e:
             logging.error(f"SCHEDULER: Error during scheduled weekly scrape: {e}")
+            return False
+
+def update_chapel_cache_job():
+    with app.app_context():
+        logging.info("SCHEDULER: Running scheduled CHAPEL scrape job...")
+        try:
+            chapel_events = get_chapel_events()
+            scrape_executor.check_cancelled()
+            if chapel_events:
+                write_cache(CHAPEL_CACHE, chapel_events)
+                logging.info(f"SCHEDULER: Chapel cache successfully updated ({len(chapel_events)} events).")
+                return True
+            logging.error("SCHEDULER: Failed to scrape chapel events.")
+            return False
+        except Exception as e:
+            logging.error(f"SCHEDULER: Error during scheduled chapel scrape: {e}")
+            return False
+
+def update_weather_cache_job():
+    with app.app_context():
+        # Another process may have refreshed it while this run was waiting to start
+        age = cache_age_seconds(read_cache(WEATHER_CACHE))
+        if age is not None and age < WEATHER_TTL_SECONDS:
+            return True
+        try:
+            readings = get_weather().get('temperature') or [{}]
+            text = readings[0].get('temperature')
+            parsed = parse_temperature(text)
+            if parsed is None:
+                logging.error(f"SCHEDULER: Could not parse the weather reading {text!r}.")
+                return False
+            scrape_executor.check_cancelled()
+            temperature, unit = parsed
+            write_cache(WEATHER_CACHE, {
+                "temperature": temperature,
+                "unit": unit,
+                "text": text,
+                "updatedAt": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            })
+            return True
+        except Exception as e:
+            logging.error(f"SCHEDULER: Error during weather scrape: {e}")
+            return False
+
+# Scrape jobs run through scrape_executor: independent sources scrape in
+# parallel, each run has a hard deadline, and a run that starts while the
+# previous one is still going is dropped.
+# name -> (job function, deadline in seconds)
+SCRAPE_JOBS = {
+    'daily_menus': (update_daily_menu_caches_job, 45),
+    'weekly_menu': (update_weekly_menu_cache_job, 60),
+    'chapel': (update_chapel_cache_job, 30),
+    'weather': (update_weather_cache_job, 20), # Refreshed on demand by /api/weather
+}
+
+# Only the leader (see leader.py) scrapes. Other workers serve whatever is in
+# cache.db and ask the leader for a run through it (CacheStore.request_job());
+# the leader takes those requests every SCRAPE_REQUEST_POLL_SECONDS.
+SCRAPE_REQUEST_POLL_SECONDS = float(os.environ.get('SCRAPE_REQUEST_POLL_SECONDS', 1))
+SCRAPE_REQUEST_WAIT_STEP = 0.2 # How often a waiting worker checks for the leader's run
+
+def _recorded_job(name, func):
+    """Wraps a job function to record each run's outcome for the workers waiting on it."""
+    def job():
+        succeeded = False
+        try:
+            result = func()
+            succeeded = result is not False
+            return result
+        finally:
+            try:
+                cache_store.record_job_run(name, succeeded)
+            except Exception as e:
+                logging.error(f"SCHEDULER: Could not record the '{name}' run: {e}")
+    return job
+
+def _request_scrape_job(name, wait):
+    """Asks the leader to run job `name`; with wait=True, returns whether its run succeeded."""
+    requested_at = cache_store.request_job(name)
+    if not wait:
+        return None
+    give_up_at = time.monotonic() + SCRAPE_JOBS[name][1] + SCRAPE_REQUEST_POLL_SECONDS + 1
+    while time.monotonic() < give_up_at:
+        time.sleep(SCRAPE_REQUEST_WAIT_STEP)
+        job_run = cache_store.job_run(name)
+        if job_run is not None and job_run['finishedAt'] >= requested_at:
+            return job_run['succeeded']
+    logging.warning(f"SCHEDULER: Gave up waiting for the leader to run '{name}'.")
+    return False
+
+def run_scrape_job(name, wait=False):
+    """
+    Starts a scrape job, or asks the leader to if this process isn't it; with
+    wait=True, blocks until the run finishes or hits its deadline.
+    """
+    if not leader.is_leader():
+        return _request_scrape_job(name, wait)
+    func, deadline_seconds = SCRAPE_JOBS[name]
+    if wait:
+        return scrape_executor.run(name, _recorded_job(name, func), deadline_seconds)
+    scrape_executor.submit(name, _recorded_job(name, func), deadline_seconds)
+
+def run_all_scrape_jobs():
+    return scrape_executor.run_all([(name, _recorded_job(name, func), deadline) for name, (func, deadline) in SCRAPE_JOBS.items()])
+
+def serve_scrape_requests():
+    """Leader only: runs the jobs other workers asked for, until the process exits."""
+    while True:
+        time.sleep(SCRAPE_REQUEST_POLL_SECONDS)
+        try:
+            for name in cache_store.take_job_requests():
+                if name in SCRAPE_JOBS:
+                    run_scrape_job(name)
+        except Exception as e:
+            logging.error(f"SCHEDULER: Could not take scrape requests: {e}")
+
+
+# --- METRICS ---
+# Every request is counted and timed per route (the URL rule, so meal ids
+# don't create new series); see metrics.py. Each worker adds what it recorded
+# to metrics.db every METRICS_FLUSH_SECONDS (and at shutdown), and /metrics,
+# whichever worker answers it, reports the totals of all of them.
+METRICS_FLUSH_SECONDS = int(os.environ.get('METRICS_FLUSH_SECONDS', 10))
+
+def flush_metrics():
+    try:
+        with metrics_db.connection() as conn:
+            metrics.flush(conn)
+    except sqlite3.Error as e:
+        logging.error(f"Database error flushing metrics, will retry: {e}")
+        return False
+
+atexit.register(flush_metrics)
+
+@app.before_request
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+    sync_profiling_settings()
+    g.profile = profiling.start(f'{request.method} {request.path}')
+
+@app.after_request
+def _record_request_metrics(response):
+    profiling.stop(g.pop('profile', None))
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.HTTP_LATENCY.observe(time.perf_counter() - started, route)
+        metrics.HTTP_REQUESTS.inc(route, request.method, str(response.status_code))
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    try:
+        with metrics_db.connection() as conn:
+            body = metrics.render_all(conn)
+    except sqlite3.Error as e:
+        logging.error(f"Database error rendering metrics: {e}")
+        return jsonify({"error": f"Database error: {e}"}), 500
+    return app.response_class(body, mimetype='text/plain; version=0.0.4')
+
+
+# --- PROFILING ---
+# Off unless PROFILE_SAMPLE_RATE is set or an admin turns it on here; see
+# profiling.py. Settings changed here are stored in cache.db and picked up by
+# every worker within RESPONSE_CACHE_CHECK_INTERVAL seconds. They last
+# PROFILING_OVERRIDE_SECONDS (or the request's "expiresIn") and then every
+# worker goes back to the environment's settings. A restarted process always
+# starts from the environment's settings.
+PROFILING_OVERRIDE_SECONDS = int(os.environ.get('PROFILING_OVERRIDE_SECONDS', 3600))
+
+_profiling_settings = {'version': 0, 'checked_at': 0.0, 'expires_at': None}
+
+def sync_profiling_settings():
+    """Applies profiling settings another process stored since the last check, and expires them."""
+    now = time.monotonic()
+    if now - _profiling_settings['checked_at'] < RESPONSE_CACHE_CHECK_INTERVAL:
+        return
+    _profiling_settings['checked_at'] = now
+    if _profiling_settings['expires_at'] is not None and time.time() >= _profiling_settings['expires_at']:
+        _profiling_settings['expires_at'] = None
+        profiling.reset()
+    try:
+        if cache_store.version(PROFILING_CACHE) == _profiling_settings['version']:
+            return
+        stored = cache_store.get(PROFILING_CACHE)
+    except (sqlite3.Error, ValueError) as e:
+        logging.error(f"Error reading the profiling settings: {e}")
+        return
+    _profiling_settings['version'] = stored['version']
+    try:
+        if stored['data']['expiresAt'] <= time.time():
+            return
+        profiling.configure(sample_rate=stored['data'].get('sampleRate'), mode=stored['data'].get('mode'),
+                            keep=stored['data'].get('keep'))
+        _profiling_settings['expires_at'] = stored['data']['expiresAt']
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
+        logging.error(f"Ignoring invalid stored profiling settings: {e}")
+
+@app.route('/api/admin/profiling', methods=['POST'])
+def profiling_settings():
+    # POST {"secret"} returns the settings and kept profiles; adding any of
+    # "sampleRate", "mode", "keep" changes those settings first, for
+    # "expiresIn" seconds (default PROFILING_OVERRIDE_SECONDS).
+    data = request.get_json(silent=True) or {}
+    if data.get('secret') != ADMIN_SECRET:
+        return jsonify({"error": "Forbidden"}), 403
+
+    if any(data.get(setting) is not None for setting in ('sampleRate', 'mode', 'keep')):
+        try:
+            expires_in = float(data.get('expiresIn') or PROFILING_OVERRIDE_SECONDS)
+            if expires_in <= 0:
+                raise ValueError("expiresIn must be positive")
+            profiling.configure(
+                sample_rate=float(data['sampleRate']) if data.get('sampleRate') is not None else None,
+                mode=data.get('mode'),
+                keep=int(data['keep']) if data.get('keep') is not None else None,
+            )
+        except (TypeError, ValueError) as e:
+            return jsonify({"error": str(e)}), 400
+        _profiling_settings['expires_at'] = time.time() + expires_in
+        try:
+            cache_store.put(PROFILING_CACHE, {**profiling.settings(), 'expiresAt': _profiling_settings['expires_at']})
+        except sqlite3.Error as e:
+            logging.error(f"Error storing the profiling settings: {e}")
+            return jsonify({"error": f"Database error: {e}"}), 500
+    return jsonify({**profiling.settings(), "expiresAt": _profiling_settings['expires_at'],
+                    "profiles": profiling.list_profiles()})
+
+@app.route('/api/admin/profiles/<int:profile_id>', methods=['POST'])
+def download_profile(profile_id):
+    # POST {"secret", "format"}: "pstats" for cProfile profiles, "collapsed" for sampled ones
+    data = request.get_json(silent=True) or {}
+    if data.get('secret') != ADMIN_SECRET:
+        return jsonify({"error": "Forbidden"}), 403
+    profile = profiling.get_profile(profile_id)
+    if profile is None:
+        return jsonify({"error": "No such profile"}), 404
+
+    output_format = data.get('format') or ('pstats' if profile['mode'] == 'cprofile' else 'collapsed')
+    if output_format == 'pstats' and profile['mode'] == 'cprofile':
+        mimetype, extension = 'application/octet-stream', 'pstats'
+    elif output_format == 'collapsed' and profile['mode'] == 'sample':
+        mimetype, extension = 'text/plain', 'collapsed.txt'
+    else:
+        return jsonify({"error": f"A {profile['mode']} profile can't be downloaded as {output_format}"}), 400
+    response = app.response_class(profile['data'], mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename=profile-{profile_id}.{extension}'
+    return response
 
 
 # --- API ENDPOINTS ---
 
+# --- LIVE UPDATES ---
+@app.route('/api/events', methods=['GET'])
+def events_endpoint():
+    # EventSource stream: one event (named after the cache key, carrying the
+    # new data) per change, so clients don't have to poll for updates.
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('lastEventId')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+
+    if event_broker.stream_count() >= events.EVENTS_MAX_STREAMS:
+        metrics.EVENT_STREAMS.inc('rejected')
+        response = jsonify({"error": "Too many open event streams"})
+        response.status_code = 503
+        response.headers['Retry-After'] = '30'
+        return response
+
+    metrics.EVENT_STREAMS.inc('opened')
+    response = app.response_class(event_broker.stream(last_event_id), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no' # Stop nginx from buffering the stream
+    return response
+
 # --- ANNOUNCEMENT ENDPOINTS (NEW) ---
 @app.route('/api/announcement', methods=['GET'])
 def get_announcement():
     # React App calls this to see if there is a new message
-    return jsonify(read_announcement_cache())
+    return cached_json_response(ANNOUNCEMENT_CACHE, _announcement_data)
 
 @app.route('/api/update-announcement', methods=['POST'])
 def update_announcement():
@@ -213,7 +599,7 @@ def update_announcement():
         "id": data.get('id')
     }
     
-    write_announcement_cache(new_data)
+    write_cache(ANNOUNCEMENT_CACHE, new_data)
     logging.info(f"Announcement updated via API: {new_data['id']}")
     return jsonify({"success": True})
 
@@ -225,88 +611,163 @@ def menu_endpoint():
     logging.info(f"Received request for /api/menu (today) type={menu_type}")
     
     if menu_type == 'non-veg':
-        cached_info = read_menu_cache_non_veg()
-        if cached_info and 'data' in cached_info:
-            return jsonify(cached_info['data'])
-        else:
-            logging.warning("Non-veg cache is empty. Performing initial scrape for /api/menu?type=non-veg.")
-            update_non_veg_menu_cache_job()
-            cached_info = read_menu_cache_non_veg()
-            return jsonify(cached_info.get('data', {}))
+        response = cached_json_response(MENU_CACHE_NON_VEG, _cache_data)
+        if response is not None:
+            return response
+        logging.warning("Non-veg cache is empty. Performing initial scrape for /api/menu?type=non-veg.")
+        run_scrape_job('daily_menus', wait=True)
+        return cached_json_response(MENU_CACHE_NON_VEG, _cache_data) or jsonify({})
     else:
-        cached_info = read_menu_cache()
-        if cached_info and 'data' in cached_info:
-            return jsonify(cached_info['data'])
-        else:
-            logging.warning("Daily cache is empty. Performing initial scrape for /api/menu.")
-            update_menu_cache_job()
-            cached_info = read_menu_cache()
-            return jsonify(cached_info.get('data', {}))
+        response = cached_json_response(MENU_CACHE, _cache_data)
+        if response is not None:
+            return response
+        logging.warning("Daily cache is empty. Performing initial scrape for /api/menu.")
+        run_scrape_job('daily_menus', wait=True)
+        return cached_json_response(MENU_CACHE, _cache_data) or jsonify({})
 
 @app.route('/api/menu/refresh', methods=['GET'])
 def menu_refresh_endpoint():
+    # ?since=<version> (the menu's ETag) gets 204 if that is still current, else
+    # {"version", "patch"} with the JSON Patch from it, or {"version", "menu"}
+    # if it is too old to diff. Without it: 204, or the whole menu if it changed.
     menu_type = request.args.get('type')
-    logging.info(f"Received request for /api/menu/refresh from client. type={menu_type}")
-    
-    if menu_type == 'non-veg':
-        cached_info = read_menu_cache_non_veg()
-        old_data = cached_info.get('data', {}) if cached_info else {}
-        new_data = get_non_veg_menu_data()
-        if json.dumps(new_data, sort_keys=True) != json.dumps(old_data, sort_keys=True):
-            logging.info("New NON-VEG menu data found via client refresh. Updating cache and returning data.")
-            write_menu_cache_non_veg(new_data)
-            return jsonify(new_data)
-        else:
-            logging.info("Client refresh scraped same NON-VEG data. Not updating UI.")
-            write_menu_cache_non_veg(old_data) 
-            return ('', 204)
+    menu_key = MENU_CACHE_NON_VEG if menu_type == 'non-veg' else MENU_CACHE
+    since = request.args.get('since')
+    logging.info(f"Received request for /api/menu/refresh from client. type={menu_type} since={since}")
+
+    # Only the version, timestamp and hash are read until there is something to send
+    meta = read_cache_meta(menu_key)
+    held = since or (meta['hash'] if meta else None)
+
+    age = cache_age_seconds(meta)
+    if age is not None and age < MENU_REFRESH_MIN_AGE_SECONDS:
+        logging.info(f"Menu cache is {age:.0f}s old, skipping live scrape (type={menu_type}).")
+    elif run_scrape_job('daily_menus', wait=True):
+        meta = read_cache_meta(menu_key)
+
+    entry = None
+    if meta and meta['hash'] != held:
+        stale = _response_cache.get(menu_key)
+        if stale and stale['version'] < meta['version']:
+            invalidate_response_cache(menu_key, meta['version']) # Don't wait for the next version check
+        entry = cached_entry(menu_key, _cache_data)
+    if entry is None or entry['hash'] == held:
+        logging.info(f"Client already has the current menu (type={menu_type}). Not updating UI.")
+        return ('', 204)
+    if not since:
+        logging.info(f"New menu data found via client refresh (type={menu_type}). Returning data.")
+        return _send_cached(menu_key, entry)
+
+    patch = menu_history.patch(menu_key, since, entry['hash'], max_bytes=len(entry['body']))
+    if patch is None:
+        logging.info(f"Client's menu version {since} is unknown here; returning the whole menu.")
+        body = b'{"version":"' + entry['hash'].encode() + b'","menu":' + entry['body'] + b'}'
     else:
-        cached_info = read_menu_cache()
-        old_data = cached_info.get('data', {}) if cached_info else {}
-        new_data = get_menu_data_for_template()
-        if json.dumps(new_data, sort_keys=True) != json.dumps(old_data, sort_keys=True):
-            logging.info("New menu data found via client refresh. Updating cache and returning data.")
-            write_menu_cache(new_data)
-            return jsonify(new_data)
-        else:
-            logging.info("Client refresh scraped same data. Not updating UI.")
-            write_menu_cache(old_data) 
-            return ('', 204)
+        body = b'{"version":"' + entry['hash'].encode() + b'","patch":' + patch + b'}'
+    return app.response_class(body, mimetype=app.json.mimetype)
 
 @app.route('/api/weekly-menu', methods=['GET'])
 def weekly_menu_endpoint():
     logging.info("Received request for /api/weekly-menu")
-    cached_info = read_weekly_menu_cache()
-    if cached_info and 'data' in cached_info:
-        return jsonify(cached_info['data'])
-    else:
-        logging.warning("Weekly cache is empty. Performing initial scrape for /api/weekly-menu.")
-        update_weekly_menu_cache_job()
-        cached_info = read_weekly_menu_cache()
-        return jsonify(cached_info.get('data', {}))
+    response = cached_json_response(WEEKLY_MENU_CACHE, _cache_data)
+    if response is not None:
+        return response
+    logging.warning("Weekly cache is empty. Performing initial scrape for /api/weekly-menu.")
+    run_scrape_job('weekly_menu', wait=True)
+    return cached_json_response(WEEKLY_MENU_CACHE, _cache_data) or jsonify({})
 
 # --- RATING ENDPOINTS ---
+# With several worker processes, votes committed by another worker are picked
+# up from vote_log (see RatingStore.catch_up), checked at most every
+# RATINGS_SYNC_SECONDS. This process's own votes are already in memory and
+# are never read back.
+RATINGS_SYNC_SECONDS = float(os.environ.get('RATINGS_SYNC_SECONDS', 2))
+
+_ratings_checked_at = 0.0
+
+def load_ratings():
+    """Loads ratings.db into rating_store. Run once at startup, before serving."""
+    with rating_store.write_lock: # So a vote being committed can't be lost by the reload
+        with ratings_db.connection() as conn, metrics.DB_QUERY_LATENCY.time('load_ratings'):
+            rating_store.load(conn)
+
+def sync_ratings():
+    """Applies the votes other processes have committed to ratings.db since the last sync."""
+    global _ratings_checked_at
+    now = time.monotonic()
+    if now - _ratings_checked_at < RATINGS_SYNC_SECONDS:
+        return
+    _ratings_checked_at = now
+    try:
+        with rating_store.write_lock, ratings_db.connection() as conn, metrics.DB_QUERY_LATENCY.time('sync_ratings'):
+            rating_store.catch_up(conn)
+    except sqlite3.Error as e:
+        logging.error(f"Database error syncing ratings: {e}")
+
 @app.route('/api/rating/<mealId>', methods=['GET'])
 def get_rating_data(mealId):
     anonymousId = request.args.get('anonymousId')
     if not anonymousId:
         return jsonify({"error": "anonymousId is required"}), 400
 
-    conn = get_ratings_db_connection()
-    agg_rating_record = conn.execute('SELECT * FROM ratings WHERE mealId = ?', (mealId,)).fetchone()
-    voter_record = conn.execute('SELECT rating FROM voters WHERE mealId = ? AND anonymousId = ?', (mealId, anonymousId)).fetchone()
-    conn.close()
+    sync_ratings()
+    return jsonify(build_rating_data(*rating_store.get(mealId, anonymousId)))
 
+def build_rating_data(total_stars, rating_count, user_rating):
+    """Shapes a meal's aggregate rating and the caller's own vote into the API response."""
     response_data = {"averageRating": 0, "ratingCount": 0, "userRating": 0}
 
-    if agg_rating_record:
-        response_data["averageRating"] = agg_rating_record['totalStars'] / agg_rating_record['ratingCount'] if agg_rating_record['ratingCount'] > 0 else 0
-        response_data["ratingCount"] = agg_rating_record['ratingCount']
+    if rating_count > 0:
+        response_data["averageRating"] = total_stars / rating_count
+        response_data["ratingCount"] = rating_count
 
-    if voter_record:
-        response_data["userRating"] = voter_record['rating']
+    if user_rating is not None:
+        response_data["userRating"] = user_rating
 
-    return jsonify(response_data)
+    return response_data
+
+RATINGS_BATCH_MAX_IDS = 2000
+
+@app.route('/api/ratings/batch', methods=['POST'])
+def get_ratings_batch():
+    # Replaces one GET /api/rating/<mealId> per meal with a single request per page.
+    data = request.get_json(silent=True) or {}
+    meal_ids, anonymousId = data.get('mealIds'), data.get('anonymousId')
+
+    if not anonymousId:
+        return jsonify({"error": "anonymousId is required"}), 400
+    if not isinstance(meal_ids, list) or not all(isinstance(m, str) for m in meal_ids):
+        return jsonify({"error": "mealIds must be a list of strings"}), 400
+    if len(meal_ids) > RATINGS_BATCH_MAX_IDS:
+        return jsonify({"error": f"At most {RATINGS_BATCH_MAX_IDS} mealIds per request"}), 400
+
+    sync_ratings()
+    ratings = rating_store.get_many(dict.fromkeys(meal_ids), anonymousId) # De-duplicated, in order
+    return jsonify({meal_id: build_rating_data(*rating) for meal_id, rating in ratings.items()})
+
+@app.route('/api/ratings/top', methods=['GET'])
+def get_top_ratings():
+    # e.g. /api/ratings/top?station=Chef's Table&min_votes=3&limit=10
+    limit = request.args.get('limit', 10, type=int)
+    min_votes = request.args.get('min_votes', 1, type=int)
+    station = request.args.get('station')
+    if limit is None or not 1 <= limit <= MAX_TOP_LIMIT:
+        return jsonify({"error": f"limit must be between 1 and {MAX_TOP_LIMIT}"}), 400
+    if min_votes is None or min_votes < 1:
+        return jsonify({"error": "min_votes must be a positive integer"}), 400
+
+    sync_ratings()
+    top = rating_store.top(limit, station_slug(station) if station else None, min_votes)
+    return jsonify([
+        {
+            "mealId": meal_id,
+            "station": station_of(meal_id),
+            "score": round(score, 3),
+            "averageRating": total_stars / rating_count,
+            "ratingCount": rating_count,
+        }
+        for meal_id, score, total_stars, rating_count in top
+    ])
 
 @app.route('/api/rate-meal', methods=['POST'])
 def rate_meal():
@@ -315,100 +776,454 @@ def rate_meal():
 
     if not mealId or not anonymousId or new_rating is None:
         return jsonify({"error": "Missing data"}), 400
+    if not isinstance(new_rating, int) or isinstance(new_rating, bool):
+        return jsonify({"error": "rating must be an integer"}), 400
 
-    conn = get_ratings_db_connection()
-    cursor = conn.cursor()
+    # Writers are serialized so rating_store sees votes in commit order
+    with rating_store.write_lock, ratings_db.connection() as conn, metrics.DB_QUERY_LATENCY.time('rate_meal'):
+        cursor = conn.cursor()
 
-    try:
-        voter_record = cursor.execute('SELECT rating FROM voters WHERE mealId = ? AND anonymousId = ?', (mealId, anonymousId)).fetchone()
+        try:
+            # Take the write lock before reading the old vote so concurrent votes can't interleave
+            cursor.execute('BEGIN IMMEDIATE')
+            # Other processes' votes first, so ours is applied on top of them
+            rating_store.catch_up(conn)
+            voter_record = cursor.execute('SELECT rating FROM voters WHERE mealId = ? AND anonymousId = ?', (mealId, anonymousId)).fetchone()
 
-        if new_rating == 0:
-            if voter_record:
+            if new_rating == 0:
+                if voter_record:
+                    old_rating = voter_record['rating']
+                    cursor.execute('DELETE FROM voters WHERE mealId = ? AND anonymousId = ?', (mealId, anonymousId))
+                    cursor.execute('UPDATE ratings SET totalStars = totalStars - ?, ratingCount = ratingCount - 1 WHERE mealId = ?', (old_rating, mealId))
+            elif voter_record:
                 old_rating = voter_record['rating']
-                cursor.execute('DELETE FROM voters WHERE mealId = ? AND anonymousId = ?', (mealId, anonymousId))
-                cursor.execute('UPDATE ratings SET totalStars = totalStars - ?, ratingCount = ratingCount - 1 WHERE mealId = ?', (old_rating, mealId))
-        elif voter_record:
-            old_rating = voter_record['rating']
-            cursor.execute('UPDATE voters SET rating = ? WHERE mealId = ? AND anonymousId = ?', (new_rating, mealId, anonymousId))
-            cursor.execute('UPDATE ratings SET totalStars = totalStars - ? + ? WHERE mealId = ?', (old_rating, new_rating, mealId))
-        else:
-            cursor.execute('INSERT INTO voters (mealId, anonymousId, rating) VALUES (?, ?, ?)',(mealId, anonymousId, new_rating))
-            cursor.execute('''
-                INSERT INTO ratings (mealId, totalStars, ratingCount) VALUES (?, ?, 1)
-                ON CONFLICT(mealId) DO UPDATE SET
-                totalStars = totalStars + excluded.totalStars,
-                ratingCount = ratingCount + 1
-            ''', (mealId, new_rating))
-        conn.commit()
-    except sqlite3.Error as e:
-        conn.rollback()
-        return jsonify({"error": f"Database error: {e}"}), 500
-    finally:
-        conn.close()
-    
+                cursor.execute('UPDATE voters SET rating = ? WHERE mealId = ? AND anonymousId = ?', (new_rating, mealId, anonymousId))
+                cursor.execute('UPDATE ratings SET totalStars = totalStars - ? + ? WHERE mealId = ?', (old_rating, new_rating, mealId))
+            else:
+                cursor.execute('INSERT INTO voters (mealId, anonymousId, rating) VALUES (?, ?, ?)',(mealId, anonymousId, new_rating))
+                cursor.execute('''
+                    INSERT INTO ratings (mealId, totalStars, ratingCount) VALUES (?, ?, 1)
+                    ON CONFLICT(mealId) DO UPDATE SET
+                    totalStars = totalStars + excluded.totalStars,
+                    ratingCount = ratingCount + 1
+                ''', (mealId, new_rating))
+            log_id = rating_store.log_vote(conn, mealId, anonymousId, new_rating)
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            return jsonify({"error": f"Database error: {e}"}), 500
+        rating_store.apply_vote(mealId, anonymousId, new_rating, log_id)
+
     return jsonify({"success": True}), 201
 
+@app.route('/api/admin/ratings/consistency', methods=['POST'])
+def check_ratings_consistency():
+    # POST {"secret", "repair"}: compares rating_store with ratings.db; with
+    # "repair": true, reloads it from the tables if they differ.
+    data = request.get_json(silent=True) or {}
+    if data.get('secret') != ADMIN_SECRET:
+        return jsonify({"error": "Forbidden"}), 403
+
+    with ratings_db.connection() as conn:
+        differences = rating_store.check_consistency(conn)
+    consistent = not differences['ratings'] and not differences['voters']
+    if not consistent:
+        logging.error(f"In-memory ratings differ from ratings.db: {len(differences['ratings'])} aggregates, {len(differences['voters'])} votes.")
+        if data.get('repair') is True:
+            load_ratings()
+    return jsonify({"consistent": consistent, **differences})
+
+# --- CHAPEL ENDPOINT ---
+# Range queries are answered by binary search over the events' start times,
+# indexed once per cache version.
+_chapel_index = {'hash': None, 'events': [], 'starts': []}
+
+def chapel_index():
+    """The timed chapel events sorted by start, with their Unix start times in `starts`."""
+    global _chapel_index
+    entry = cached_entry(CHAPEL_CACHE, _chapel_data)
+    index = _chapel_index
+    if index['hash'] != entry['hash']:
+        chapel_events = sorted((event for event in entry['payload'] if isinstance(event, dict) and event.get('timestamp') is not None),
+                               key=lambda event: event['timestamp'])
+        index = {'hash': entry['hash'], 'events': chapel_events, 'starts': [event['timestamp'] for event in chapel_events]}
+        _chapel_index = index
+    return index
+
+def parse_time_arg(value):
+    """An ISO 8601 date or datetime argument as Unix seconds; times without an offset are chapel-local."""
+    parsed = datetime.datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=CHAPEL_TIMEZONE)
+    return parsed.timestamp()
+
 @app.route('/api/chapel', methods=['GET'])
 def chapel_endpoint():
-    cached_info = read_chapel_cache()
-    if not cached_info:
-        return jsonify([])
-    return jsonify(cached_info.get('data', []))
+    # ?upcoming=5 -> the next 5 events; ?from=2025-10-01&to=2025-11-01 -> events
+    # starting in that range (both may be combined). These return
+    # {"events", "total"}, total being the number of events in the range.
+    if not any(arg in request.args for arg in ('upcoming', 'from', 'to')):
+        return cached_json_response(CHAPEL_CACHE, _chapel_data)
+
+    upcoming = request.args.get('upcoming', type=int)
+    if 'upcoming' in request.args and (upcoming is None or upcoming < 1):
+        return jsonify({"error": "upcoming must be a positive integer"}), 400
+    try:
+        start = parse_time_arg(request.args['from']) if request.args.get('from') else (time.time() if upcoming else None)
+        end = parse_time_arg(request.args['to']) if request.args.get('to') else None
+    except ValueError:
+        return jsonify({"error": "from and to must be ISO 8601 dates or times"}), 400
+
+    index = chapel_index()
+    first = bisect.bisect_left(index['starts'], start) if start is not None else 0
+    last = max(first, bisect.bisect_left(index['starts'], end)) if end is not None else len(index['starts'])
+    chapel_events = index['events'][first:min(last, first + upcoming) if upcoming else last]
+    return jsonify({"events": chapel_events, "total": last - first})
+
+# --- WEATHER ENDPOINT ---
+# Stale-while-revalidate: requests always get the cached reading at once; the
+# first request after it goes stale starts a background refresh (at most one
+# at a time, see scrape_executor.submit) and later ones keep getting the old
+# reading until the new one is written.
+_weather_refresh_started = 0.0
+
+def revalidate_weather():
+    global _weather_refresh_started
+    now = time.monotonic()
+    if now - _weather_refresh_started < WEATHER_RETRY_SECONDS:
+        return
+    _weather_refresh_started = now
+    run_scrape_job('weather')
+
+@app.route('/api/weather', methods=['GET'])
+def weather_endpoint():
+    entry = cached_entry(WEATHER_CACHE, _cache_data)
+    if entry is None:
+        revalidate_weather()
+        response = jsonify({"error": "Weather is not available yet"})
+        response.status_code = 503
+        response.headers['Retry-After'] = '5'
+        return response
+
+    try:
+        updated_at = datetime.datetime.fromisoformat(entry['payload']['updatedAt'])
+        age = max(0, int((datetime.datetime.now(datetime.timezone.utc) - updated_at).total_seconds()))
+    except (KeyError, TypeError, ValueError):
+        age = WEATHER_TTL_SECONDS
+    if age >= WEATHER_TTL_SECONDS:
+        revalidate_weather()
+
+    response = _send_cached(WEATHER_CACHE, entry)
+    response.headers['Age'] = str(age)
+    response.cache_control.public = True
+    response.cache_control.max_age = max(0, WEATHER_TTL_SECONDS - age)
+    return response
+
+# --- SEARCH ENDPOINT ---
+@app.route('/api/search', methods=['GET'])
+def search_menu_archive():
+    # e.g. /api/search?q=orange chicken&station=Chef's Table -> when it was last served
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"error": "q is required"}), 400
+    limit = request.args.get('limit', menu_archive.DEFAULT_SEARCH_LIMIT, type=int)
+
+    try:
+        with archive_db.connection() as conn, metrics.DB_QUERY_LATENCY.time('search'):
+            results = menu_archive.search(conn, query, request.args.get('station'), limit)
+    except sqlite3.Error as e:
+        logging.error(f"Database error searching menu archive: {e}")
+        return jsonify({"error": f"Database error: {e}"}), 500
+    return jsonify({"query": query, "results": results})
 
 # --- ANALYTICS ENDPOINTS ---
-ANALYTICS_DB = 'analytics.db'
+# Page loads are counted in memory and written to analytics.db in one batch
+# every PAGE_LOAD_FLUSH_SECONDS (and at shutdown) instead of once per view.
+# For exact totals, /api/get-loads asks every other worker to flush early
+# through the page_load_workers table, which each worker checks every
+# PAGE_LOAD_SYNC_SECONDS, and waits up to PAGE_LOAD_SYNC_TIMEOUT for them.
+PAGE_LOAD_FLUSH_SECONDS = int(os.environ.get('PAGE_LOAD_FLUSH_SECONDS', 30))
+PAGE_LOAD_SYNC_SECONDS = float(os.environ.get('PAGE_LOAD_SYNC_SECONDS', 0.5))
+PAGE_LOAD_SYNC_TIMEOUT = float(os.environ.get('PAGE_LOAD_SYNC_TIMEOUT', 2))
+PAGE_LOAD_HEARTBEAT_SECONDS = 5   # How often an idle worker marks itself alive
+PAGE_LOAD_WORKER_TIMEOUT = 15     # A worker not seen for this long is presumed gone
 
-def get_analytics_db_connection():
-    conn = sqlite3.connect(ANALYTICS_DB)
-    conn.row_factory = sqlite3.Row
-    return conn
+_pending_page_loads = collections.Counter() # date -> loads not yet in the table
+_page_load_lock = threading.Lock()          # guards _pending_page_loads
+_page_load_flush_lock = threading.Lock()    # serializes flushes with get_loads reads
 
-@app.route('/api/record-load', methods=['POST'])
-def record_load():
-    today = datetime.date.today().isoformat()
-    conn = get_analytics_db_connection()
-    cursor = conn.cursor()
+def flush_page_loads():
+    """Writes the buffered page-load deltas to the page_loads table."""
+    with _page_load_flush_lock:
+        with _page_load_lock:
+            pending = dict(_pending_page_loads)
+            _pending_page_loads.clear()
+        if not pending:
+            return
+
+        try:
+            with analytics_db.connection() as conn, metrics.DB_QUERY_LATENCY.time('flush_page_loads'):
+                conn.executemany('''
+                    INSERT INTO page_loads (date, count) VALUES (?, ?)
+                    ON CONFLICT(date) DO UPDATE SET count = count + excluded.count
+                ''', pending.items())
+                conn.commit()
+            logging.info(f"Flushed page loads: {pending}")
+        except sqlite3.Error as e:
+            logging.error(f"Database error flushing page loads, will retry: {e}")
+            with _page_load_lock:
+                _pending_page_loads.update(pending)
+            return False
+
+atexit.register(flush_page_loads)
+
+def sync_page_loads():
+    """Checks in this worker and flushes its page loads when get_loads asks, until the process exits."""
+    pid = os.getpid()
+    seen_at = 0.0
+    while True:
+        time.sleep(PAGE_LOAD_SYNC_SECONDS)
+        try:
+            with analytics_db.connection() as conn:
+                row = conn.execute('SELECT flush_requested, flushed FROM page_load_workers WHERE pid = ?', (pid,)).fetchone()
+            flushed = None
+            if row is not None and row['flush_requested'] > row['flushed']:
+                if flush_page_loads() is False:
+                    continue
+                flushed = row['flush_requested']
+            elif row is not None and time.time() - seen_at < PAGE_LOAD_HEARTBEAT_SECONDS:
+                continue
+
+            seen_at = time.time()
+            with analytics_db.connection() as conn:
+                conn.execute('''
+                    INSERT INTO page_load_workers (pid, seen_at) VALUES (?, ?)
+                    ON CONFLICT(pid) DO UPDATE SET seen_at = excluded.seen_at, flushed = MAX(flushed, COALESCE(?, flushed))
+                ''', (pid, seen_at, flushed))
+                conn.commit()
+        except sqlite3.Error as e:
+            logging.error(f"Database error syncing page loads: {e}")
+
+def _leave_page_load_workers():
     try:
-        cursor.execute('''
-            INSERT INTO page_loads (date, count) VALUES (?, 1)
-            ON CONFLICT(date) DO UPDATE SET count = count + 1
-        ''', (today,))
-        conn.commit()
+        with analytics_db.connection() as conn:
+            conn.execute('DELETE FROM page_load_workers WHERE pid = ?', (os.getpid(),))
+            conn.commit()
     except sqlite3.Error as e:
-        logging.error(f"Database error recording load: {e}")
-        return jsonify({"error": str(e)}), 500
-    finally:
-        conn.close()
+        logging.error(f"Database error leaving page_load_workers: {e}")
+
+def _flush_other_workers():
+    """Asks every other live worker to flush its page loads and waits until they have."""
+    now = time.time()
+    with analytics_db.connection() as conn:
+        conn.execute('DELETE FROM page_load_workers WHERE seen_at < ?', (now - PAGE_LOAD_WORKER_TIMEOUT,))
+        waiting = {row['pid']: row['flush_requested'] for row in conn.execute(
+            'UPDATE page_load_workers SET flush_requested = flush_requested + 1 WHERE pid != ? RETURNING pid, flush_requested',
+            (os.getpid(),))}
+        conn.commit()
+
+    give_up_at = time.monotonic() + PAGE_LOAD_SYNC_TIMEOUT
+    while waiting and time.monotonic() < give_up_at:
+        time.sleep(PAGE_LOAD_SYNC_SECONDS / 2)
+        with analytics_db.connection() as conn:
+            placeholders = ','.join('?' * len(waiting))
+            for row in conn.execute(f'SELECT pid, flushed FROM page_load_workers WHERE pid IN ({placeholders})', list(waiting)):
+                if row['flushed'] >= waiting[row['pid']]:
+                    del waiting[row['pid']]
+    if waiting:
+        logging.warning(f"Page loads of workers {sorted(waiting)} weren't flushed in time; totals may lag.")
+
+def count_page_load():
+    today = datetime.date.today().isoformat()
+    with _page_load_lock:
+        _pending_page_loads[today] += 1
+
+@app.route('/api/record-load', methods=['POST'])
+def record_load():
+    count_page_load()
     return jsonify({"success": True}), 201
 
 @app.route('/api/get-loads', methods=['GET'])
 def get_loads():
-    conn = get_analytics_db_connection()
     try:
-        loads = conn.execute('SELECT * FROM page_loads ORDER BY date DESC').fetchall()
-        return jsonify([dict(row) for row in loads])
+        _flush_other_workers()
+        with _page_load_flush_lock:
+            with analytics_db.connection() as conn, metrics.DB_QUERY_LATENCY.time('get_loads'):
+                loads = {row['date']: row['count'] for row in conn.execute('SELECT date, count FROM page_loads')}
+            with _page_load_lock:
+                # Include this worker's loads that haven't been flushed yet so the totals are exact
+                for date, count in _pending_page_loads.items():
+                    loads[date] = loads.get(date, 0) + count
+        return jsonify([{'date': date, 'count': loads[date]} for date in sorted(loads, reverse=True)])
     except sqlite3.Error as e:
         logging.error(f"Database error getting loads: {e}")
         return jsonify({"error": str(e)}), 500
-    finally:
-        conn.close()
+
+# --- BOOTSTRAP ENDPOINT ---
+# Everything the page needs for its first paint in one response. The shared
+# part is spliced together from the response cache bodies, so no JSON is
+# encoded for it, and is kept with its compressed variants until one of them
+# changes. Only the caller's ratings are encoded (and gzipped) per request.
+# (field, cache key, extract, body sent if the cache is empty)
+BOOTSTRAP_PARTS = (
+    ('weeklyMenu', WEEKLY_MENU_CACHE, _cache_data, b'{}'),
+    ('chapel', CHAPEL_CACHE, _chapel_data, b'[]'),
+    ('announcement', ANNOUNCEMENT_CACHE, _announcement_data, b'{}'),
+)
+
+_bootstrap_cache = {} # menu cache key -> shared part, see _bootstrap_shared()
+_bootstrap_lock = threading.Lock()
+
+def _bootstrap_shared(menu_key):
+    """
+    Returns {'versions', 'menu', 'prefix', 'body', 'hash', 'variants', 'gzip_prefix'}:
+    the response body without its closing brace (`prefix`), the complete
+    body without ratings and its compressed variants.
+    """
+    menu_entry = cached_entry(menu_key, _cache_data)
+    parts = [('menu', menu_entry, b'{}')]
+    parts += [(field, cached_entry(key, extract), default) for field, key, extract, default in BOOTSTRAP_PARTS]
+    versions = tuple(entry['version'] if entry else None for _, entry, _ in parts)
+
+    shared = _bootstrap_cache.get(menu_key)
+    if shared and shared['versions'] == versions:
+        return shared
+
+    prefix = b'{' + b','.join(f'"{field}":'.encode() + (entry['body'] if entry else default) for field, entry, default in parts)
+    if menu_entry:
+        # What to send as ?since= to /api/menu/refresh
+        prefix += b',"menuVersion":"' + menu_entry['hash'].encode() + b'"'
+    body = prefix + b'}'
+    shared = {
+        'versions': versions,
+        'menu': menu_entry['payload'] if menu_entry else {},
+        'prefix': prefix,
+        'body': body,
+        'hash': content_hash(body)[:16],
+        'variants': compression.precompress(body),
+        'gzip_prefix': compression.gzip_prefix(prefix),
+    }
+    with _bootstrap_lock:
+        _bootstrap_cache[menu_key] = shared
+    return shared
+
+def _menu_meal_ids(menu, date):
+    """The ids of every meal on `menu`, in order, as the frontend builds them on `date`."""
+    return dict.fromkeys(
+        meal_id(station.get('name'), option.get('meal'), date)
+        for stations in menu.values() if isinstance(stations, list)
+        for station in stations
+        for option in station.get('options', [])
+    )
+
+@app.route('/api/bootstrap', methods=['GET'])
+def bootstrap():
+    # e.g. /api/bootstrap?type=non-veg&anonymousId=...&date=2026-10-17
+    # `date` is the client's local date, which its meal ids are built from.
+    menu_key = MENU_CACHE_NON_VEG if request.args.get('type') == 'non-veg' else MENU_CACHE
+    anonymousId = request.args.get('anonymousId')
+    date = request.args.get('date') or datetime.date.today().isoformat()
+    try:
+        datetime.date.fromisoformat(date)
+    except ValueError:
+        return jsonify({"error": "date must be YYYY-MM-DD"}), 400
+
+    if cached_entry(menu_key, _cache_data) is None:
+        logging.warning(f"'{menu_key}' cache is empty. Performing initial scrape for /api/bootstrap.")
+        run_scrape_job('daily_menus', wait=True)
+    shared = _bootstrap_shared(menu_key)
+    count_page_load()
+
+    if not anonymousId:
+        return _send_cached('bootstrap', shared)
+
+    sync_ratings()
+    ratings = rating_store.get_many(_menu_meal_ids(shared['menu'], date), anonymousId)
+    suffix = b',"ratings":' + app.json.dumps(
+        {meal: build_rating_data(*rating) for meal, rating in ratings.items()}).encode() + b'}'
+    if compression.negotiate(request.accept_encodings, {'gzip': None}):
+        body, encoding = compression.gzip_with_prefix(shared['gzip_prefix'], suffix), 'gzip'
+    else:
+        body, encoding = shared['prefix'] + suffix, None
+    response = app.response_class(body, mimetype=app.json.mimetype)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    metrics.RESPONSE_BYTES.inc('bootstrap', encoding or 'identity', amount=len(body))
+    return response
+
+
+# --- APP FACTORY ---
+# Production: gunicorn -c gunicorn.conf.py 'server:create_app()'
+# Every worker serves requests and flushes its own page-load counts; exactly
+# one of them (see leader.py) also runs the scrape jobs, including the ones
+# other workers request (see run_scrape_job()). Other workers see new cache.db
+# versions within RESPONSE_CACHE_CHECK_INTERVAL seconds of a write.
+LEADER_RETRY_SECONDS = int(os.environ.get('LEADER_RETRY_SECONDS', 30))
+
+_scheduler = None
+
+def _become_leader(scheduler, wait_for_scrapes=False):
+    """Schedules the scrape jobs if this process wins the leader lock."""
+    if not leader.try_acquire():
+        return False
+    if scheduler.get_job('leader_election'):
+        scheduler.remove_job('leader_election')
+    scheduler.add_job(run_scrape_job, 'interval', minutes=60, args=['daily_menus'])
+    scheduler.add_job(run_scrape_job, 'interval', hours=4, args=['weekly_menu'])
+    scheduler.add_job(run_scrape_job, 'interval', hours=6, args=['chapel'])
+    # A thread rather than a scheduler job, which would log every second
+    threading.Thread(target=serve_scrape_requests, name='scrape-requests', daemon=True).start()
+
+    logging.info("Performing initial menu scrapes...")
+    if wait_for_scrapes:
+        startup_results = run_all_scrape_jobs()
+        logging.info(f"Initial scrapes finished: {startup_results}")
+    else:
+        for name in SCRAPE_JOBS:
+            run_scrape_job(name)
+    return True
+
+def create_app(wait_for_scrapes=False):
+    """
+    Prepares the databases and background jobs and returns the WSGI app.
+    Call once per process (not with gunicorn --preload: threads don't survive fork).
+
+    Args:
+        wait_for_scrapes (bool): Block until the initial scrapes finish if this
+                                 process becomes the leader.
+    """
+    global _scheduler
+    if _scheduler is not None:
+        return app
+
+    ratings_db.migrate()
+    analytics_db.migrate()
+    archive_db.migrate()
+    metrics_db.migrate()
+    cache_store.db.migrate()
+    for key, (path, wrapped) in LEGACY_CACHE_FILES.items():
+        cache_store.import_json_file(key, path, wrapped)
+    load_ratings()
+    # Settings an admin stored before this process started don't apply to it
+    _profiling_settings['version'] = cache_store.version(PROFILING_CACHE)
+
+    _scheduler = BackgroundScheduler(daemon=True)
+    _scheduler.add_job(metrics.timed_job('flush_page_loads', flush_page_loads), 'interval', seconds=PAGE_LOAD_FLUSH_SECONDS)
+    _scheduler.add_job(flush_metrics, 'interval', seconds=METRICS_FLUSH_SECONDS)
+    _scheduler.start()
+    threading.Thread(target=sync_page_loads, name='page-load-sync', daemon=True).start()
+    atexit.register(_leave_page_load_workers)
+    if not _become_leader(_scheduler, wait_for_scrapes):
+        logging.info(f"Another process is the scheduler leader; retrying every {LEADER_RETRY_SECONDS}s.")
+        _scheduler.add_job(_become_leader, 'interval', seconds=LEADER_RETRY_SECONDS, args=[_scheduler], id='leader_election')
+    return app
 
 
 # --- MAIN EXECUTION ---
 if __name__ == '__main__':
-    scheduler = BackgroundScheduler(daemon=True)
-    scheduler.add_job(update_menu_cache_job, 'interval', minutes=60)
-    scheduler.add_job(update_non_veg_menu_cache_job, 'interval', minutes=60)
-    scheduler.add_job(update_weekly_menu_cache_job, 'interval', hours=4)
-    scheduler.start()
-    
-    with app.app_context():
-        logging.info("Performing initial daily menu scrape on startup...")
-        update_menu_cache_job()
-        logging.info("Performing initial daily NON-VEG menu scrape on startup...")
-        update_non_veg_menu_cache_job()
-        logging.info("Performing initial weekly menu scrape on startup...")
-        update_weekly_menu_cache_job()
+    # Development server; see create_app() for production.
+    create_app(wait_for_scrapes=True)
 
     logging.info("Starting Flask server and background scheduler.")
-    app.run(debug=False, host='0.0.0.0', port=5001)
\ No newline at end of file
+    app.run(debug=False, host='0.0.0.0', port=5001)
@@ -12,6 +12,9 @@ import ElasticSlider from './components/ElasticSlider';
 import Aurora from './components/Aurora';
 import FeedbackModal from './components/Feedback.jsx';
 import { getAnonymousId } from './utils/anonymousId';
+import { subscribeToServerEvents, supportsServerEvents } from './utils/serverEvents';
+import { primeRatings } from './utils/ratingsBatch';
+import { applyPatch } from './utils/jsonPatch';
 
 // --- Console Log Catcher ---
 let consoleLogs = [];
@@ -78,6 +81,12 @@ const getCookie = (name) => {
   return null;
 };
 
+// Today's date as meal IDs use it (see createMealId in MealItem.jsx)
+const getLocalDateString = () => {
+  const date = new Date();
+  return `${date.getFullYear()}-${String(date.getMonth() + 1).padStart(2, '0')}-${String(date.getDate()).padStart(2, '0')}`;
+};
+
 // Helper function to capitalize each word
 const capitalizeWords = (str) => {
   if (!str) return '';
@@ -857,36 +866,15 @@ function App() {
     setAnonymousId(getAnonymousId());
   }, []);
 
-  useEffect(() => {
-    if (effectRan.current === false) {
-      fetch(`${API_BASE_URL}/record-load`, { method: 'POST' })
-        .catch(err => console.error("Could not record page load:", err));
-      effectRan.current = true;
-    }
-  }, [API_BASE_URL]);
-
-  // --- Fetch Announcement Data on Load ---
-  useEffect(() => {
-    const fetchAnnouncement = async () => {
-      try {
-        const response = await fetch(`${API_BASE_URL}/announcement`);
-        if (response.ok) {
-          const data = await response.json();
-          if (data && data.message && data.id) {
-            const closedId = getCookie('closedAnnouncementId');
-            // Only show if the current ID is DIFFERENT from the one stored in cookies
-            if (String(closedId) !== String(data.id)) {
-              setAnnouncement({ show: true, message: data.message, id: data.id });
-            }
-          }
-        }
-      } catch (error) {
-        console.error("Failed to fetch announcement:", error);
+  const showAnnouncement = useCallback((data) => {
+    if (data && data.message && data.id) {
+      const closedId = getCookie('closedAnnouncementId');
+      // Only show if the current ID is DIFFERENT from the one stored in cookies
+      if (String(closedId) !== String(data.id)) {
+        setAnnouncement({ show: true, message: data.message, id: data.id });
       }
-    };
-
-    fetchAnnouncement();
-  }, [API_BASE_URL]);
+    }
+  }, []);
 
   const closeAnnouncement = useCallback(() => {
     if (announcement.id) {
@@ -1005,69 +993,126 @@ function App() {
     }
   }, [isChapelVisible]);
 
-  useEffect(() => {
-    let isMounted = true;
-    const fetchMenuData = async () => {
-      const loaderTimer = setTimeout(() => { if (isMounted) setShowMenuLoader(true); }, 300);
-      try {
-        const url = isNonVegMode ? `${API_BASE_URL}/menu?type=non-veg` : `${API_BASE_URL}/menu`;
-        const initialResponse = await fetch(url);
-        if (!initialResponse.ok) throw new Error(`HTTP error! Status: ${initialResponse.status}`);
-        const initialData = await initialResponse.json();
-        if (isMounted) setMenuData(initialData);
-      } catch (e) {
-        if (isMounted) setMenuError(e.message);
-      } finally {
-        clearTimeout(loaderTimer);
-        if (isMounted) setIsMenuLoading(false);
-      }
-      try {
-        const refreshUrl = isNonVegMode ? `${API_BASE_URL}/menu/refresh?type=non-veg` : `${API_BASE_URL}/menu/refresh`;
-        const refreshResponse = await fetch(refreshUrl);
-        if (refreshResponse.status === 200) {
-          const newData = await refreshResponse.json();
-          if (isMounted) setMenuData(newData);
-        }
-      } catch (e) {
-        console.error("Error during background menu refresh:", e);
+  // Version (content hash) of the menu on screen, if known, so a refresh
+  // only has to send what changed since.
+  const menuVersion = useRef(null);
+
+  // Asks for a live refresh of the menu on screen, as a patch from
+  // menuVersion when the server still has that version.
+  const refreshMenu = useCallback(async (nonVeg) => {
+    try {
+      const params = new URLSearchParams();
+      if (nonVeg) params.set('type', 'non-veg');
+      if (menuVersion.current) params.set('since', menuVersion.current);
+      const refreshResponse = await fetch(`${API_BASE_URL}/menu/refresh?${params}`);
+      if (refreshResponse.status !== 200) return;
+      const data = await refreshResponse.json();
+      if (!menuVersion.current) {
+        setMenuData(data);
+      } else if (data.patch) {
+        setMenuData(prev => applyPatch(prev, data.patch));
+      } else {
+        setMenuData(data.menu);
       }
-    };
+      menuVersion.current = data.version || null;
+    } catch (e) {
+      console.error("Error during background menu refresh:", e);
+    }
+  }, [API_BASE_URL]);
+
+  // Browsers without EventSource don't get newer menus pushed, so they ask
+  // for a live refresh once the cached menu is on screen.
+  const refreshMenuWithoutServerEvents = useCallback((nonVeg) => {
+    if (!supportsServerEvents()) refreshMenu(nonVeg);
+  }, [refreshMenu]);
 
-    const fetchChapel = async () => {
-      if (!isMounted) return;
-      const loaderTimer = setTimeout(() => { if (isMounted) setShowChapelLoader(true); }, 300);
+  // The menu variant on screen (null until the first load), so toggling
+  // non-veg mode only fetches the other menu.
+  const loadedMenuType = useRef(null);
+
+  // --- Load First-Paint Data ---
+  // One /bootstrap request returns the menu, weekly menu, chapel events,
+  // announcement and this user's ratings, and counts the page load.
+  useEffect(() => {
+    if (effectRan.current) return;
+    effectRan.current = true;
+
+    const fetchBootstrap = async () => {
+      const loaderTimer = setTimeout(() => { setShowMenuLoader(true); setShowChapelLoader(true); }, 300);
       try {
-        const response = await fetch(`${API_BASE_URL}/chapel`);
+        const userId = getAnonymousId();
+        const params = new URLSearchParams({ date: getLocalDateString() });
+        if (isNonVegMode) params.set('type', 'non-veg');
+        if (isRatingVisible) params.set('anonymousId', userId);
+        const response = await fetch(`${API_BASE_URL}/bootstrap?${params}`);
         if (!response.ok) throw new Error(`HTTP error! Status: ${response.status}`);
         const data = await response.json();
-        if (isMounted) setChapelData(data);
+        if (data.ratings) primeRatings(data.ratings, userId);
+        loadedMenuType.current = isNonVegMode;
+        menuVersion.current = data.menuVersion || null;
+        setMenuData(data.menu);
+        setWeeklyMenuData(data.weeklyMenu);
+        setChapelData(data.chapel);
+        showAnnouncement(data.announcement);
       } catch (e) {
-        if (isMounted) setChapelError(e.message);
+        setMenuError(e.message);
+        setChapelError(e.message);
       } finally {
         clearTimeout(loaderTimer);
-        if (isMounted) setIsChapelLoading(false);
+        setIsMenuLoading(false);
+        setIsChapelLoading(false);
       }
+      refreshMenuWithoutServerEvents(isNonVegMode);
     };
 
-    // Fetch weekly menu data
-    const fetchWeeklyMenu = async () => {
-      if (!isMounted) return;
+    fetchBootstrap();
+  }, [API_BASE_URL, isNonVegMode, isRatingVisible, showAnnouncement, refreshMenuWithoutServerEvents]);
+
+  // --- Switch Menu Variant ---
+  useEffect(() => {
+    if (loadedMenuType.current === null || loadedMenuType.current === isNonVegMode) return undefined;
+    let isMounted = true;
+    const fetchMenuData = async () => {
+      const loaderTimer = setTimeout(() => { if (isMounted) setShowMenuLoader(true); }, 300);
       try {
-        const response = await fetch(`${API_BASE_URL}/weekly-menu`);
+        const url = isNonVegMode ? `${API_BASE_URL}/menu?type=non-veg` : `${API_BASE_URL}/menu`;
+        const response = await fetch(url);
         if (!response.ok) throw new Error(`HTTP error! Status: ${response.status}`);
         const data = await response.json();
-        if (isMounted) setWeeklyMenuData(data);
+        if (isMounted) {
+          loadedMenuType.current = isNonVegMode;
+          menuVersion.current = null;
+          setMenuData(data);
+        }
       } catch (e) {
-        console.error("Could not fetch weekly menu:", e);
+        if (isMounted) setMenuError(e.message);
+      } finally {
+        clearTimeout(loaderTimer);
+        if (isMounted) setIsMenuLoading(false);
       }
+      if (isMounted) refreshMenuWithoutServerEvents(isNonVegMode);
     };
 
     fetchMenuData();
-    fetchChapel();
-    fetchWeeklyMenu();
-
     return () => { isMounted = false; };
-  }, [API_BASE_URL, isNonVegMode]);
+  }, [API_BASE_URL, isNonVegMode, refreshMenuWithoutServerEvents]);
+
+  // --- Live Updates ---
+  useEffect(() => {
+    if (!supportsServerEvents()) return undefined;
+    return subscribeToServerEvents({
+      [isNonVegMode ? 'menu_non_veg' : 'menu']: (menu) => {
+        menuVersion.current = null; // Pushed menus carry no version to patch from
+        setMenuData(menu);
+      },
+      weekly_menu: setWeeklyMenuData,
+      chapel: setChapelData,
+      announcement: showAnnouncement,
+    }, {
+      // Turned away (or offline) until a reconnect succeeds: refresh instead
+      onUnavailable: () => refreshMenu(isNonVegMode),
+    });
+  }, [isNonVegMode, showAnnouncement, refreshMenu]);
 
   useLayoutEffect(() => {
     if (isMenuLoading || !mealCardRef.current || !mealContentRef.current || !pageContentRef.current || isSettingsVisible) return;
@@ -1238,7 +1283,7 @@ function App() {
     if (!chapelData || chapelData.length === 0) return <><h2 className="meal-period-title">Chapel</h2><p>No chapel events listed.</p></>;
 
     const allUpcomingEvents = chapelData
-      .map(event => ({ ...event, dateObject: parseChapelDate(event.time) }))
+      .map(event => ({ ...event, dateObject: event.timestamp ? new Date(event.timestamp * 1000) : parseChapelDate(event.time) }))
       .filter(event => event.dateObject && event.dateObject > new Date());
 
     const remainingCredits = allUpcomingEvents.length;
@@ -2,6 +2,7 @@ import React, { useState, useEffect, useCallback, useRef } from 'react';
 import { createPortal } from 'react-dom';
 import { gsap } from 'gsap';
 import Star from './Star';
+import { loadRating } from '../utils/ratingsBatch';
 
 const API_BASE_URL = import.meta.env.VITE_API_BASE_URL;
 
@@ -66,9 +67,8 @@ const MealRating = ({ mealId, anonymousId, showRatingCount }) => {
   const fetchRatingData = useCallback(async () => {
     if (!mealId || !anonymousId) return;
     try {
-      const response = await fetch(`${API_BASE_URL}/rating/${mealId}?anonymousId=${anonymousId}`);
-      if (response.ok) {
-        const data = await response.json();
+      const data = await loadRating(mealId, anonymousId);
+      if (data) {
         setRatingData(data);
       }
     } catch (error) {
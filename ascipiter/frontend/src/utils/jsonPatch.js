@@ -0,0 +1,32 @@
+const unescapeToken = (token) => token.replace(/~1/g, '/').replace(/~0/g, '~');
+
+/**
+ * Applies JSON Patch (RFC 6902) add/remove/replace operations, as sent by
+ * /menu/refresh?since=, to a copy of a document.
+ * @param {*} document The document the patch was computed from.
+ * @param {Array<{op: string, path: string, value: *}>} operations Applied in order.
+ * @returns {*} The patched copy; `document` itself is left unchanged.
+ */
+export const applyPatch = (document, operations) => {
+  let result = structuredClone(document);
+  operations.forEach(({ op, path, value }) => {
+    if (path === '') {
+      result = structuredClone(value);
+      return;
+    }
+    const tokens = path.split('/').slice(1).map(unescapeToken);
+    const last = tokens.pop();
+    const parent = tokens.reduce((node, token) => node[Array.isArray(node) ? Number(token) : token], result);
+    if (Array.isArray(parent)) {
+      const index = Number(last);
+      if (op === 'add') parent.splice(index, 0, value);
+      else if (op === 'remove') parent.splice(index, 1);
+      else parent[index] = value;
+    } else if (op === 'remove') {
+      delete parent[last];
+    } else {
+      parent[last] = value;
+    }
+  });
+  return result;
+};
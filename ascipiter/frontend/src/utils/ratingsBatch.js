@@ -0,0 +1,67 @@
+const API_BASE_URL = import.meta.env.VITE_API_BASE_URL;
+
+// Requests queued during the current tick, grouped by anonymousId.
+let pendingByUser = new Map();
+let flushScheduled = false;
+
+// Ratings that arrived with /bootstrap, each used once instead of a request.
+const primedRatings = new Map();
+const primedKey = (mealId, anonymousId) => `${anonymousId}|${mealId}`;
+
+const flushPending = async () => {
+  const batches = pendingByUser;
+  pendingByUser = new Map();
+  flushScheduled = false;
+
+  for (const [anonymousId, waiters] of batches) {
+    const mealIds = [...waiters.keys()];
+    try {
+      const response = await fetch(`${API_BASE_URL}/ratings/batch`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ mealIds, anonymousId }),
+      });
+      if (!response.ok) throw new Error(`Batch rating request failed: ${response.status}`);
+      const data = await response.json();
+      waiters.forEach((callbacks, mealId) => callbacks.forEach(({ resolve }) => resolve(data[mealId])));
+    } catch (error) {
+      waiters.forEach((callbacks) => callbacks.forEach(({ reject }) => reject(error)));
+    }
+  }
+};
+
+/**
+ * Loads the rating data for one meal. Calls made in the same tick are sent
+ * to the server as a single /ratings/batch request.
+ * @param {string} mealId The meal to look up.
+ * @param {string} anonymousId The current user's anonymous ID.
+ * @returns {Promise<{averageRating: number, ratingCount: number, userRating: number}>}
+ */
+export const loadRating = (mealId, anonymousId) => new Promise((resolve, reject) => {
+  const key = primedKey(mealId, anonymousId);
+  if (primedRatings.has(key)) {
+    resolve(primedRatings.get(key));
+    primedRatings.delete(key); // Later loads (e.g. after a vote) ask the server
+    return;
+  }
+
+  if (!pendingByUser.has(anonymousId)) pendingByUser.set(anonymousId, new Map());
+  const waiters = pendingByUser.get(anonymousId);
+  if (!waiters.has(mealId)) waiters.set(mealId, []);
+  waiters.get(mealId).push({ resolve, reject });
+
+  if (!flushScheduled) {
+    flushScheduled = true;
+    setTimeout(flushPending, 0);
+  }
+});
+
+/**
+ * Stores the rating data returned by /bootstrap so the first loadRating()
+ * call for each of those meals resolves without a request.
+ * @param {Object<string, {averageRating: number, ratingCount: number, userRating: number}>} ratings Rating data by meal ID.
+ * @param {string} anonymousId The user the ratings were loaded for.
+ */
+export const primeRatings = (ratings, anonymousId) => {
+  Object.entries(ratings).forEach(([mealId, data]) => primedRatings.set(primedKey(mealId, anonymousId), data));
+};
@@ -0,0 +1,63 @@
+const API_BASE_URL = import.meta.env.VITE_API_BASE_URL;
+
+// Delay before reopening a stream the browser has given up on, doubled after
+// each failed attempt up to the maximum.
+const RECONNECT_MIN_MS = 5000;
+const RECONNECT_MAX_MS = 5 * 60 * 1000;
+
+/**
+ * Whether this browser can receive live updates from /events.
+ * @returns {boolean}
+ */
+export const supportsServerEvents = () => typeof EventSource !== 'undefined';
+
+/**
+ * Listens to the server's /events stream. Each event is named after the data
+ * that changed ('menu', 'menu_non_veg', 'weekly_menu', 'chapel',
+ * 'announcement') and carries its new value. EventSource reconnects on its
+ * own after a dropped connection and resumes from the last event it
+ * received, but gives up for good when the server answers with an error
+ * status (e.g. 503 when it is at its stream limit). The stream is then
+ * reopened here with backoff and jitter, and `onUnavailable` is called each
+ * time so the caller can fetch updates another way in the meantime.
+ * @param {Object<string, function(*): void>} handlers Callback per event name.
+ * @param {{onUnavailable: function(): void}} [options]
+ * @returns {function(): void} Closes the stream.
+ */
+export const subscribeToServerEvents = (handlers, { onUnavailable } = {}) => {
+  let source = null;
+  let lastEventId = null;
+  let retryTimer = null;
+  let delay = RECONNECT_MIN_MS;
+  let isClosed = false;
+
+  const connect = () => {
+    const query = lastEventId ? `?${new URLSearchParams({ lastEventId })}` : '';
+    source = new EventSource(`${API_BASE_URL}/events${query}`);
+    source.onopen = () => { delay = RECONNECT_MIN_MS; };
+    source.onerror = () => {
+      if (isClosed || source.readyState !== EventSource.CLOSED) return;
+      if (onUnavailable) onUnavailable();
+      // Jittered so clients turned away together don't all come back together
+      retryTimer = setTimeout(connect, delay / 2 + Math.random() * delay / 2);
+      delay = Math.min(delay * 2, RECONNECT_MAX_MS);
+    };
+    Object.entries(handlers).forEach(([name, handler]) => {
+      source.addEventListener(name, (event) => {
+        if (event.lastEventId) lastEventId = event.lastEventId;
+        try {
+          handler(JSON.parse(event.data));
+        } catch (error) {
+          console.error(`Could not handle '${name}' event:`, error);
+        }
+      });
+    });
+  };
+
+  connect();
+  return () => {
+    isClosed = true;
+    clearTimeout(retryTimer);
+    source.close();
+  };
+};